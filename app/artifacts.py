@@ -0,0 +1,125 @@
+"""
+Content-addressed artifact store for uploads (failed-rows outputs are built
+from ned_results on download, see app.main).
+
+Files live once under DATA_DIR/artifacts/<sha[:2]>/<sha256><ext>[.gz],
+however many jobs reference them. Jobs hold references in job_artifacts
+(app.db); an artifact is deleted once its last referencing job is cleaned
+up. Files are gzip'ed only when that saves at least COMPRESS_MIN_SAVING
+(xlsx is already a zip, so uploads are usually kept as-is).
+"""
+import gzip, hashlib, os, tempfile
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.settings import DATA_DIR
+from app.db import get_artifact, insert_artifact, add_artifact_ref, renew_artifact, touch_artifact
+
+STORE_DIR = os.path.join(DATA_DIR, "artifacts")
+COMPRESS_MIN_SAVING = 0.10
+CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".xlsm": "application/vnd.ms-excel.sheet.macroEnabled.12",
+    ".csv": "text/csv",
+}
+
+
+def _ext(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if ext in MEDIA_TYPES else ".xlsx"
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def put_bytes(data: bytes, filename: str) -> dict:
+    """Store data (once) and return its artifact row."""
+    sha = hashlib.sha256(data).hexdigest()
+    existing = get_artifact(sha)
+    if existing:
+        # Renewed before the check, so gc_artifacts leaves it until attach()
+        renew_artifact(sha)
+        if os.path.exists(existing["path"]):
+            return existing
+
+    ext = _ext(filename)
+    base = os.path.join(STORE_DIR, sha[:2], sha + ext)
+    packed = gzip.compress(data, compresslevel=6)
+    if len(packed) <= len(data) * (1 - COMPRESS_MIN_SAVING):
+        path, encoding, stored = base + ".gz", "gzip", packed
+    else:
+        path, encoding, stored = base, "identity", data
+
+    _write_atomic(path, stored)
+    insert_artifact(sha, path, ext, encoding, len(data), len(stored))
+    return get_artifact(sha)
+
+
+def attach(job_id: str, role: str, artifact: dict, filename: str):
+    """Reference an artifact from a job (keeps it alive until the job is cleaned up)."""
+    add_artifact_ref(job_id, role, artifact["sha256"], filename)
+
+
+def artifact_for_path(path: str):
+    """Artifact row for a stored path, or None for files outside the store."""
+    if not path or not os.path.abspath(path).startswith(os.path.abspath(STORE_DIR) + os.sep):
+        return None
+    return get_artifact(os.path.basename(path)[:64])
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
+def serve(request: Request, path: str, filename: str) -> Response:
+    """
+    Download response for a stored file: strong ETag (the content hash),
+    304 on If-None-Match, and Range support via FileResponse. gzip'ed
+    artifacts are sent as-is with Content-Encoding when the client accepts
+    it, otherwise decompressed on the fly (without Range).
+    """
+    artifact = artifact_for_path(path)
+    if artifact is None:
+        # Legacy output written straight into the job folder
+        return FileResponse(path, filename=filename, media_type=MEDIA_TYPES[_ext(path)])
+
+    media_type = MEDIA_TYPES.get(artifact["ext"], "application/octet-stream")
+    gzip_ok = "gzip" in request.headers.get("accept-encoding", "")
+    if artifact["encoding"] == "gzip" and gzip_ok:
+        etag = f'"{artifact["sha256"]}-gz"'
+    else:
+        etag = f'"{artifact["sha256"]}"'
+    headers = {"etag": etag, "cache-control": "private, no-cache", "vary": "Accept-Encoding"}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    touch_artifact(artifact["sha256"])
+    if artifact["encoding"] == "identity":
+        return FileResponse(artifact["path"], filename=filename, media_type=media_type, headers=headers)
+    if gzip_ok:
+        headers["content-encoding"] = "gzip"
+        return FileResponse(artifact["path"], filename=filename, media_type=media_type, headers=headers)
+
+    def stream():
+        with gzip.open(artifact["path"], "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    headers["content-disposition"] = f'attachment; filename="{filename}"'
+    headers["content-length"] = str(artifact["size"])
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
@@ -1,4 +1,4 @@
-import os, sqlite3, time
+import os, sqlite3, time, json, shutil
 from app.settings import DATA_DIR
 
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -23,19 +23,175 @@ def init_db():
           out2_path TEXT
         )
         """)
+        _ensure_columns(con, "jobs", JOB_EXTRA_COLUMNS)
+        con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_fingerprint ON jobs(fingerprint, created_at)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_source ON jobs(source_job_id)")
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS vessels (
+          name TEXT PRIMARY KEY,
+          value TEXT,
+          synced_at REAL NOT NULL
+        )
+        """)
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS artifacts (
+          sha256 TEXT PRIMARY KEY,
+          path TEXT NOT NULL,
+          ext TEXT NOT NULL,
+          encoding TEXT NOT NULL,
+          size INTEGER NOT NULL,
+          stored_size INTEGER NOT NULL,
+          created_at REAL NOT NULL,
+          last_access REAL,
+          downloads INTEGER NOT NULL DEFAULT 0
+        )
+        """)
+        # One row per (job, role) reference; an artifact lives while it has any
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS job_artifacts (
+          job_id TEXT NOT NULL,
+          role TEXT NOT NULL,
+          sha256 TEXT NOT NULL,
+          filename TEXT,
+          PRIMARY KEY (job_id, role)
+        )
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS idx_job_artifacts_sha ON job_artifacts(sha256)")
+        # Outcome of every input row, written as the worker goes; kept past job
+        # cleanup for the failed-NED stats (pruned after NED_HISTORY_DAYS)
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS ned_results (
+          job_id TEXT NOT NULL,
+          list TEXT NOT NULL,
+          row_num INTEGER NOT NULL,
+          ned TEXT,
+          vessel TEXT,
+          status TEXT NOT NULL,
+          reason TEXT,
+          elapsed_ms INTEGER,
+          finished_at REAL NOT NULL,
+          PRIMARY KEY (job_id, list, row_num)
+        ) WITHOUT ROWID
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS idx_ned_results_status ON ned_results(status, finished_at, ned)")
+        # Portal step durations of completed runs, kept past job cleanup for estimates
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS step_timings (
+          job_id TEXT NOT NULL,
+          vessel TEXT NOT NULL DEFAULT '',
+          step TEXT NOT NULL,
+          items INTEGER NOT NULL,
+          seconds REAL NOT NULL,
+          finished_at REAL NOT NULL
+        )
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS idx_step_timings ON step_timings(step, vessel, finished_at)")
         con.commit()
 
-def create_job(job_id, token, upload1_path, upload2_path, col1, col2, vessel):
+# Columns added after the original schema; created on new and old DB files alike
+JOB_EXTRA_COLUMNS = {
+    "rows1": "INTEGER",
+    "rows2": "INTEGER",
+    "coalesced_into": "TEXT",
+    "job_type": "TEXT NOT NULL DEFAULT 'single'",
+    "vessels": "TEXT",            # JSON list; every vessel the job touches
+    "vessel_col1": "TEXT",
+    "vessel_col2": "TEXT",
+    "progress": "TEXT",           # JSON {vessel: {"off": {...}, "on": {...}}}
+    "outputs": "TEXT",            # JSON {vessel: {"excel1": path, "excel2": path}}; legacy jobs only
+    "preflight": "TEXT",          # JSON summary from app.preflight
+    "fingerprint": "TEXT",        # sha256 over upload contents + job options
+    "source_job_id": "TEXT",       # set on duplicate submissions that reuse another job
+    "reuse": "TEXT",                # 'attached' (source queued/running) or 'cached' (completed)
+    "predicted_seconds": "REAL",    # app.estimates prediction at submit time
+    "job_timeout": "INTEGER",       # RQ timeout derived from the prediction
+    "started_at": "REAL",
+    "browser_memory": "TEXT",       # JSON memory watchdog summary (worker.browser_memory)
+}
+JSON_COLUMNS = ("vessels", "progress", "outputs", "preflight", "browser_memory")
+
+def _ensure_columns(con, table, columns):
+    """Add columns introduced after a DB file was first created."""
+    existing = {r[1] for r in con.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+def _decode(row):
+    if not row:
+        return None
+    job = dict(row)
+    for key in JSON_COLUMNS:
+        if job.get(key):
+            job[key] = json.loads(job[key])
+    if not job.get("vessels"):
+        job["vessels"] = [job["vessel"]] if job.get("vessel") else []
+    return job
+
+def create_job(job_id, token, upload1_path, upload2_path, col1, col2, vessel, rows1=None, rows2=None,
+               job_type="single", vessels=None, vessel_col1=None, vessel_col2=None, preflight=None,
+               fingerprint=None, predicted_seconds=None, job_timeout=None):
     now = time.time()
+    vessels = vessels if vessels is not None else [vessel]
     with sqlite3.connect(DB_PATH) as con:
         con.execute("""
         INSERT INTO jobs(job_id, token, status, created_at, updated_at, error,
-                         upload1_path, upload2_path, col1, col2, vessel, out1_path, out2_path)
-        VALUES(?, ?, 'QUEUED', ?, ?, NULL, ?, ?, ?, ?, ?, NULL, NULL)
-        """, (job_id, token, now, now, upload1_path, upload2_path, col1, col2, vessel))
+                         upload1_path, upload2_path, col1, col2, vessel, out1_path, out2_path,
+                         rows1, rows2, job_type, vessels, vessel_col1, vessel_col2, preflight,
+                         fingerprint, predicted_seconds, job_timeout)
+        VALUES(?, ?, 'QUEUED', ?, ?, NULL, ?, ?, ?, ?, ?, NULL, NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (job_id, token, now, now, upload1_path, upload2_path, col1, col2, vessel, rows1, rows2,
+              job_type, json.dumps(vessels), vessel_col1, vessel_col2,
+              json.dumps(preflight) if preflight is not None else None, fingerprint,
+              predicted_seconds, job_timeout))
         con.commit()
 
-def update_job(job_id, status=None, error=None, out1_path=None, out2_path=None):
+def create_alias_job(job_id, token, source, reuse):
+    """
+    Record a duplicate submission that reuses source's run instead of starting
+    a new one. Status and outputs are read through to the source (resolve_job).
+    """
+    now = time.time()
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("""
+        INSERT INTO jobs(job_id, token, status, created_at, updated_at, error,
+                         upload1_path, upload2_path, col1, col2, vessel, job_type, vessels,
+                         vessel_col1, vessel_col2, fingerprint, source_job_id, reuse)
+        VALUES(?, ?, ?, ?, ?, NULL, '', '', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (job_id, token, source["status"], now, now, source["col1"], source["col2"], source["vessel"],
+              source.get("job_type") or "single", json.dumps(source["vessels"]),
+              source.get("vessel_col1"), source.get("vessel_col2"), source.get("fingerprint"),
+              source["job_id"], reuse))
+        con.commit()
+
+def find_job_by_fingerprint(fingerprint):
+    """Most recent original (non-alias) job with this fingerprint."""
+    with sqlite3.connect(DB_PATH) as con:
+        con.row_factory = sqlite3.Row
+        row = con.execute("""
+        SELECT * FROM jobs WHERE fingerprint=? AND source_job_id IS NULL
+        ORDER BY created_at DESC LIMIT 1
+        """, (fingerprint,)).fetchone()
+        return _decode(row)
+
+def merge_alias(job, source):
+    """The source job's state under the alias's own id and token."""
+    merged = dict(source)
+    for key in ("job_id", "token", "created_at", "source_job_id", "reuse"):
+        merged[key] = job[key]
+    return merged
+
+def resolve_job(job):
+    """For an alias row, the source job's state under the alias's own id and token."""
+    if not job or not job.get("source_job_id"):
+        return job
+    source = get_job(job["source_job_id"])
+    if not source:
+        return job
+    return merge_alias(job, source)
+
+def update_job(job_id, status=None, error=None, out1_path=None, out2_path=None, coalesced_into=None,
+               progress=None, outputs=None, started_at=None, browser_memory=None):
     now = time.time()
     fields, vals = ["updated_at=?"], [now]
     if status is not None:
@@ -46,32 +202,252 @@ def update_job(job_id, status=None, error=None, out1_path=None, out2_path=None):
         fields.append("out1_path=?"); vals.append(out1_path)
     if out2_path is not None:
         fields.append("out2_path=?"); vals.append(out2_path)
+    if coalesced_into is not None:
+        fields.append("coalesced_into=?"); vals.append(coalesced_into)
+    if progress is not None:
+        fields.append("progress=?"); vals.append(json.dumps(progress))
+    if outputs is not None:
+        fields.append("outputs=?"); vals.append(json.dumps(outputs))
+    if started_at is not None:
+        fields.append("started_at=?"); vals.append(started_at)
+    if browser_memory is not None:
+        fields.append("browser_memory=?"); vals.append(json.dumps(browser_memory))
     vals.append(job_id)
     with sqlite3.connect(DB_PATH) as con:
         con.execute(f"UPDATE jobs SET {', '.join(fields)} WHERE job_id=?", vals)
         con.commit()
 
+def ping_db():
+    """Cheap query for readiness checks; raises if the DB is unusable."""
+    with sqlite3.connect(DB_PATH, timeout=5) as con:
+        con.execute("SELECT 1 FROM jobs LIMIT 1").fetchall()
+
 def get_job(job_id):
     with sqlite3.connect(DB_PATH) as con:
         con.row_factory = sqlite3.Row
         row = con.execute("SELECT * FROM jobs WHERE job_id=?", (job_id,)).fetchone()
-        return dict(row) if row else None
+        return _decode(row)
 
 def get_job_by_token(token):
     with sqlite3.connect(DB_PATH) as con:
         con.row_factory = sqlite3.Row
         row = con.execute("SELECT * FROM jobs WHERE token=?", (token,)).fetchone()
-        return dict(row) if row else None
+        return _decode(row)
 
 def delete_job_files_and_row(job_id):
+    """Delete a job with its aliases; returns the deleted job ids."""
     job = get_job(job_id)
     if not job:
-        return
+        return []
+    job_dir = os.path.join(DATA_DIR, job_id)
+    with sqlite3.connect(DB_PATH) as con:
+        # Aliases only point at this job's run and outputs, so they go with it.
+        # ned_results stay for the stats: without the job row and its uploads
+        # nothing downloads them, and job ids are never reused.
+        ids = [r[0] for r in con.execute(
+            "SELECT job_id FROM jobs WHERE job_id=? OR source_job_id=?", (job_id, job_id))]
+        con.executemany("DELETE FROM job_artifacts WHERE job_id=?", [(i,) for i in ids])
+        con.execute("DELETE FROM jobs WHERE job_id=? OR source_job_id=?", (job_id, job_id))
+        con.commit()
+    for i in ids:
+        shutil.rmtree(os.path.join(DATA_DIR, i), ignore_errors=True)
+    # Files written before the artifact store existed live in the job folder
     for key in ("upload1_path","upload2_path","out1_path","out2_path"):
         p = job.get(key)
-        if p and os.path.exists(p):
+        if p and p.startswith(job_dir + os.sep) and os.path.exists(p):
             try: os.remove(p)
             except: pass
+    gc_artifacts()
+    return ids
+
+def list_jobs_updated_before(cutoff):
+    with sqlite3.connect(DB_PATH) as con:
+        return [r[0] for r in con.execute(
+            "SELECT job_id FROM jobs WHERE updated_at < ? AND source_job_id IS NULL", (cutoff,))]
+
+# ---------------- per-NED results ----------------
+
+def record_ned_results(records):
+    """
+    Store row outcomes. Each record: job_id, list ('excel1'/'excel2'), row_num
+    (Excel row number), ned, vessel, status ('ok'/'failed'), reason,
+    elapsed_ms, finished_at.
+    """
+    if not records:
+        return
     with sqlite3.connect(DB_PATH) as con:
-        con.execute("DELETE FROM jobs WHERE job_id=?", (job_id,))
+        con.executemany("""
+        INSERT OR REPLACE INTO ned_results(job_id, list, row_num, ned, vessel, status, reason,
+                                           elapsed_ms, finished_at)
+        VALUES(:job_id, :list, :row_num, :ned, :vessel, :status, :reason, :elapsed_ms, :finished_at)
+        """, records)
         con.commit()
+
+def list_ned_results(job_id, which, status=None, vessel=None):
+    sql, vals = "SELECT * FROM ned_results WHERE job_id=? AND list=?", [job_id, which]
+    if status is not None:
+        sql += " AND status=?"; vals.append(status)
+    if vessel is not None:
+        sql += " AND vessel=?"; vals.append(vessel)
+    with sqlite3.connect(DB_PATH) as con:
+        con.row_factory = sqlite3.Row
+        return [dict(r) for r in con.execute(sql + " ORDER BY row_num", vals)]
+
+def has_ned_results(job_id):
+    with sqlite3.connect(DB_PATH) as con:
+        return con.execute("SELECT 1 FROM ned_results WHERE job_id=? LIMIT 1", (job_id,)).fetchone() is not None
+
+def ned_result_vessels(job_id):
+    with sqlite3.connect(DB_PATH) as con:
+        return [r[0] for r in con.execute(
+            "SELECT DISTINCT vessel FROM ned_results WHERE job_id=? AND vessel IS NOT NULL AND vessel != ''"
+            " ORDER BY vessel", (job_id,))]
+
+def top_failed_neds(since, limit=20):
+    """NEDs that failed most often since the given timestamp."""
+    with sqlite3.connect(DB_PATH) as con:
+        con.row_factory = sqlite3.Row
+        return [dict(r) for r in con.execute("""
+        SELECT ned, COUNT(*) AS failures, COUNT(DISTINCT job_id) AS jobs, MAX(finished_at) AS last_failed_at,
+               (SELECT reason FROM ned_results r2 WHERE r2.ned = r.ned AND r2.status = 'failed'
+                ORDER BY finished_at DESC LIMIT 1) AS last_reason
+        FROM ned_results r
+        WHERE status = 'failed' AND finished_at >= ? AND ned IS NOT NULL AND ned != ''
+        GROUP BY ned ORDER BY failures DESC, last_failed_at DESC LIMIT ?
+        """, (since, limit))]
+
+def prune_ned_results(before):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("DELETE FROM ned_results WHERE finished_at < ?", (before,))
+        con.commit()
+
+# ---------------- step timings ----------------
+
+def record_step_timings(job_id, steps):
+    """steps: dicts with vessel, step, items, seconds, finished_at."""
+    if not steps:
+        return
+    with sqlite3.connect(DB_PATH) as con:
+        con.executemany("""
+        INSERT INTO step_timings(job_id, vessel, step, items, seconds, finished_at)
+        VALUES(?, ?, ?, ?, ?, ?)
+        """, [(job_id, s.get("vessel") or "", s["step"], s["items"], s["seconds"], s["finished_at"])
+              for s in steps])
+        con.commit()
+
+def recent_step_timings(step, vessel=None, limit=30):
+    """Latest timings of a step, for one vessel or (vessel=None) any vessel."""
+    sql, vals = "SELECT * FROM step_timings WHERE step=? AND items > 0", [step]
+    if vessel is not None:
+        sql += " AND vessel=?"; vals.append(vessel)
+    vals.append(limit)
+    try:
+        with sqlite3.connect(DB_PATH) as con:
+            con.row_factory = sqlite3.Row
+            return [dict(r) for r in con.execute(sql + " ORDER BY finished_at DESC LIMIT ?", vals)]
+    except sqlite3.OperationalError:
+        return []
+
+def prune_step_timings(before):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("DELETE FROM step_timings WHERE finished_at < ?", (before,))
+        con.commit()
+
+# ---------------- artifacts ----------------
+
+def get_artifact(sha256):
+    with sqlite3.connect(DB_PATH) as con:
+        con.row_factory = sqlite3.Row
+        row = con.execute("SELECT * FROM artifacts WHERE sha256=?", (sha256,)).fetchone()
+        return dict(row) if row else None
+
+def insert_artifact(sha256, path, ext, encoding, size, stored_size):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("""
+        INSERT OR REPLACE INTO artifacts(sha256, path, ext, encoding, size, stored_size, created_at)
+        VALUES(?, ?, ?, ?, ?, ?, ?)
+        """, (sha256, path, ext, encoding, size, stored_size, time.time()))
+        con.commit()
+
+def add_artifact_ref(job_id, role, sha256, filename=None):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("""
+        INSERT OR REPLACE INTO job_artifacts(job_id, role, sha256, filename) VALUES(?, ?, ?, ?)
+        """, (job_id, role, sha256, filename))
+        con.commit()
+
+def renew_artifact(sha256):
+    """Restart an artifact's gc grace period (an upload is stored again before it is referenced)."""
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("UPDATE artifacts SET last_access=? WHERE sha256=?", (time.time(), sha256))
+        con.commit()
+
+def touch_artifact(sha256):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("UPDATE artifacts SET last_access=?, downloads=downloads+1 WHERE sha256=?",
+                    (time.time(), sha256))
+        con.commit()
+
+def gc_artifacts(min_age_seconds=300):
+    """
+    Delete artifacts no job references any more. Fresh ones are kept for a
+    grace period: an upload is stored (or found stored and renewed) just
+    before its job row references it.
+    """
+    cutoff = time.time() - min_age_seconds
+    unused = """
+        MAX(created_at, COALESCE(last_access, 0)) < ? AND sha256 NOT IN (SELECT sha256 FROM job_artifacts)
+    """
+    deleted = 0
+    with sqlite3.connect(DB_PATH) as con:
+        rows = con.execute(f"SELECT sha256, path FROM artifacts WHERE {unused}", (cutoff,)).fetchall()
+        for sha256, path in rows:
+            # Checked again under the write lock: renewed or referenced meanwhile
+            if not con.execute(f"DELETE FROM artifacts WHERE sha256=? AND {unused}", (sha256, cutoff)).rowcount:
+                con.rollback()
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception:
+                con.rollback()
+                continue
+            con.commit()
+            deleted += 1
+    return deleted
+
+def artifact_usage(limit=100):
+    with sqlite3.connect(DB_PATH) as con:
+        con.row_factory = sqlite3.Row
+        totals = dict(con.execute("""
+        SELECT COUNT(*) AS artifacts, COALESCE(SUM(size), 0) AS size,
+               COALESCE(SUM(stored_size), 0) AS stored_size, COALESCE(SUM(downloads), 0) AS downloads
+        FROM artifacts
+        """).fetchone())
+        totals["references"] = con.execute("SELECT COUNT(*) FROM job_artifacts").fetchone()[0]
+        items = [dict(r) for r in con.execute("""
+        SELECT a.sha256, a.ext, a.encoding, a.size, a.stored_size, a.created_at, a.last_access,
+               a.downloads, COUNT(r.job_id) AS refs
+        FROM artifacts a LEFT JOIN job_artifacts r ON r.sha256 = a.sha256
+        GROUP BY a.sha256 ORDER BY a.stored_size DESC LIMIT ?
+        """, (limit,))]
+    return {"totals": totals, "artifacts": items}
+
+def replace_vessels(entries):
+    """Replace the vessel catalog with options read from the portal's location dropdown."""
+    now = time.time()
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("DELETE FROM vessels")
+        con.executemany("INSERT OR REPLACE INTO vessels(name, value, synced_at) VALUES(?, ?, ?)",
+                        [(e["name"], e["value"], now) for e in entries])
+        con.commit()
+
+def list_vessels():
+    try:
+        with sqlite3.connect(DB_PATH) as con:
+            con.row_factory = sqlite3.Row
+            return [dict(r) for r in con.execute("SELECT * FROM vessels ORDER BY rowid")]
+    except sqlite3.OperationalError:
+        # Table not created yet (init_db not run in this process)
+        return []
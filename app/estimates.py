@@ -0,0 +1,81 @@
+"""
+Job duration prediction from the step timings of completed runs.
+
+A run costs a login and a logout, then per vessel a vessel switch plus one
+OFF DUTY and one ON DUTY pass whose time grows with the number of NEDs.
+Each step's cost is the median of its recent history for that vessel,
+falling back to all vessels and then to DEFAULT_STEP_SECONDS.
+"""
+import statistics, time
+
+from app.db import recent_step_timings
+from app.settings import (
+    JOB_TIMEOUT_FACTOR, JOB_TIMEOUT_MARGIN_SECONDS, JOB_TIMEOUT_MIN_SECONDS, JOB_TIMEOUT_MAX_SECONDS
+)
+
+# Seconds per item (per NED for the duty passes) before any history exists
+DEFAULT_STEP_SECONDS = {
+    "login": 30.0,
+    "select_vessel": 5.0,
+    "off_duty": 8.0,
+    "on_duty": 10.0,
+    "logout": 5.0,
+}
+HISTORY_LIMIT = 30       # recent runs considered per step
+MIN_SAMPLES = 3          # fewer than this for a vessel -> use all vessels
+RATE_CACHE_SECONDS = 300
+
+_rates = {}
+
+
+def step_seconds(step: str, vessel: str = None) -> float:
+    """Typical seconds per item of a step (cached for RATE_CACHE_SECONDS)."""
+    key = (step, vessel)
+    hit = _rates.get(key)
+    if hit and time.time() - hit[1] < RATE_CACHE_SECONDS:
+        return hit[0]
+
+    rate = DEFAULT_STEP_SECONDS[step]
+    for scope in ([vessel, None] if vessel else [None]):
+        rows = recent_step_timings(step, vessel=scope, limit=HISTORY_LIMIT)
+        if len(rows) >= MIN_SAMPLES:
+            rate = statistics.median(r["seconds"] / r["items"] for r in rows)
+            break
+    _rates[key] = (rate, time.time())
+    return rate
+
+
+def predict_seconds(rows_by_vessel: dict) -> float:
+    """Expected run time for {vessel: (off NEDs, on NEDs)} searched in one session."""
+    work = {v: counts for v, counts in rows_by_vessel.items() if counts[0] or counts[1]}
+    if not work:
+        return 0.0    # nothing to search: the worker skips the browser
+    total = step_seconds("login") + step_seconds("logout")
+    for vessel, (n_off, n_on) in work.items():
+        total += step_seconds("select_vessel", vessel)
+        total += n_off * step_seconds("off_duty", vessel)
+        total += n_on * step_seconds("on_duty", vessel)
+    return total
+
+
+def job_timeout(predicted: float) -> int:
+    """RQ timeout for a job predicted to take `predicted` seconds."""
+    seconds = predicted * JOB_TIMEOUT_FACTOR + JOB_TIMEOUT_MARGIN_SECONDS
+    return int(min(JOB_TIMEOUT_MAX_SECONDS, max(JOB_TIMEOUT_MIN_SECONDS, seconds)))
+
+
+def remaining_seconds(job: dict, now: float = None) -> float:
+    """
+    Time left for a running job: the unfinished share of its prediction,
+    going by progress when there is some, else by elapsed time.
+    """
+    predicted = job.get("predicted_seconds") or 0.0
+    now = now or time.time()
+    done = total = 0
+    for p in (job.get("progress") or {}).values():
+        for key in ("off", "on"):
+            done += p[key]["done"]
+            total += p[key]["total"]
+    if total and done:
+        return predicted * (total - done) / total
+    return max(0.0, predicted - (now - (job.get("started_at") or now)))
@@ -1,20 +1,119 @@
-from openpyxl import load_workbook, Workbook
+"""
+Reading uploads and writing failed-rows files.
+
+Parsing goes through app.sheet_readers (CSV, a fast xlsx column reader,
+openpyxl for full rows). Parse results are cached on disk per file content
+under DATA_DIR/parse_cache, so the web process (headers, pre-flight) and
+the worker (NED lists) parse an upload once between them. Entries are
+plain JSON, with dates and times tagged (see _encode).
+"""
+import csv, datetime, gzip, hashlib, io, json, os, tempfile, time
+
+from app.settings import DATA_DIR
+from app.sheet_readers import reader_for
+
+CACHE_DIR = os.path.join(DATA_DIR, "parse_cache")
+CACHE_VERSION = 2
+# openpyxl cell values JSON has no type for: {"__type__": name, "value": ...}
+_TEMPORAL = (("datetime", datetime.datetime), ("date", datetime.date), ("time", datetime.time))
+
+def _source(path: str):
+    """File contents as a seekable file object, plus their sha256."""
+    # The artifact store keeps compressible files gzip'ed
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        data = f.read()
+    return io.BytesIO(data), hashlib.sha256(data).hexdigest()
+
+def _cache_path(sha: str) -> str:
+    return os.path.join(CACHE_DIR, sha[:2], sha + ".json")
+
+def _encode(value):
+    # datetime before date: it is a subclass
+    for name, cls in _TEMPORAL:
+        if isinstance(value, cls):
+            return {"__type__": name, "value": value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {"__type__": "timedelta", "value": value.total_seconds()}
+    raise TypeError(f"cannot cache {type(value).__name__}")
+
+def _decode(obj: dict):
+    kind = obj.get("__type__")
+    if kind is None or len(obj) != 2:
+        return obj
+    if kind == "timedelta":
+        return datetime.timedelta(seconds=obj["value"])
+    return dict(_TEMPORAL)[kind].fromisoformat(obj["value"])
+
+def _load_cached(sha: str) -> dict:
+    try:
+        with open(_cache_path(sha), encoding="utf-8") as f:
+            entry = json.load(f, object_hook=_decode)
+        if entry.get("version") == CACHE_VERSION:
+            return entry
+    except Exception:
+        pass
+    return {"version": CACHE_VERSION, "header": None, "n_rows": None, "columns": {}, "rows": None}
+
+def _store_cached(sha: str, entry: dict):
+    path = _cache_path(sha)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, default=_encode)
+        os.replace(tmp, path)
+    except Exception as e:
+        # The cache only saves time; a failed write is not an error
+        print(f"parse cache write failed for {sha}: {e}")
+
+def prune_parse_cache(max_age_seconds: float) -> int:
+    """Drop cache entries not written for max_age_seconds."""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for root, _dirs, files in os.walk(CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
 
 def read_headers(path: str):
-    wb = load_workbook(path, read_only=True, data_only=True)
-    ws = wb.worksheets[0]
-    headers = []
-    for cell in ws[1]:
-        headers.append("" if cell.value is None else str(cell.value).strip())
-    wb.close()
-    return [h for h in headers if h != ""]
+    src, sha = _source(path)
+    entry = _load_cached(sha)
+    if entry["header"] is None:
+        entry["header"] = reader_for(path).headers(src)
+        _store_cached(sha, entry)
+    return [h for h in entry["header"] if h != ""]
+
+def read_columns(path: str, columns: list):
+    """
+    (header_row, {name: values}) for just the named columns, one value per
+    data row. Names missing from the header are left out of the dict.
+    """
+    src, sha = _source(path)
+    entry = _load_cached(sha)
+    missing = [c for c in columns if c not in entry["columns"]]
+    if missing and (entry["header"] is None or set(missing) & set(entry["header"])):
+        header, n_rows, found = reader_for(path).columns(src, missing)
+        entry.update(header=header, n_rows=n_rows)
+        entry["columns"].update(found)
+        _store_cached(sha, entry)
+    return entry["header"], {c: entry["columns"][c] for c in columns if c in entry["columns"]}
 
 def read_rows_as_dicts(path: str):
-    wb = load_workbook(path, read_only=True, data_only=True)
-    ws = wb.worksheets[0]
-    header_row = [("" if c.value is None else str(c.value).strip()) for c in ws[1]]
+    src, sha = _source(path)
+    entry = _load_cached(sha)
+    if entry["rows"] is None:
+        entry["header"], entry["rows"] = reader_for(path, full=True).rows(src)
+        _store_cached(sha, entry)
+    header_row = entry["header"]
     rows = []
-    for r in ws.iter_rows(min_row=2, values_only=True):
+    for r in entry["rows"]:
         row_dict = {}
         for i, h in enumerate(header_row):
             if h == "":
@@ -22,13 +121,24 @@ def read_rows_as_dicts(path: str):
             v = r[i] if i < len(r) else None
             row_dict[h] = v
         rows.append(row_dict)
-    wb.close()
     return header_row, rows
 
-def write_failed_rows(out_path: str, header_row: list, failed_rows: list[dict]):
-    wb = Workbook()
-    ws = wb.active
+def write_failed_rows(out_path, header_row: list, failed_rows: list[dict]):
+    # out_path may also be a file object (e.g. BytesIO for downloads)
+    from openpyxl import Workbook    # heavy; only needed when an xlsx is written
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
     ws.append(header_row)
     for row in failed_rows:
         ws.append([row.get(h, None) for h in header_row])
     wb.save(out_path)
+
+def iter_failed_rows_csv(header_row: list, failed_rows: list[dict]):
+    """CSV text of the failed rows, one line per chunk (for streaming)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for values in [header_row] + [[row.get(h, None) for h in header_row] for row in failed_rows]:
+        writer.writerow(["" if v is None else v for v in values])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
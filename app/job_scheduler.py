@@ -0,0 +1,202 @@
+"""
+Redis-backed scheduler in front of the RQ "pob" queue.
+
+Jobs are not enqueued on RQ directly. They wait in a sorted set (shortest
+predicted run first, see app.estimates, with waiting time counted against
+size so a large job is not starved) and dispatch() moves them to RQ only when
+  - the portal account has fewer than PORTAL_MAX_SESSIONS jobs running
+    (fewer while the portal breaker is DEGRADED, none while OPEN; see
+    app.portal_health), and
+  - none of the job's vessels is being processed by another job, or held
+    back for a higher-ranked job that is still waiting (so a multi-vessel
+    job is not overtaken forever by single-vessel jobs taking turns).
+dispatch() runs on submit, whenever a job finishes, and on a periodic tick
+from the web process as a safety net. Other tasks that log in to the portal
+(the vessel catalog sync) are submitted the same way with their own task
+name, so they count against the same session limit.
+"""
+import json, time
+
+from redis.exceptions import LockError
+
+from app.settings import PORTAL_MAX_SESSIONS
+from app import portal_health
+
+PENDING_KEY = "pob:sched:pending"     # zset job_id -> score (predicted seconds, aged, see _score)
+META_KEY = "pob:sched:meta"           # hash job_id -> json
+ACTIVE_KEY = "pob:sched:active"       # hash job_id -> json
+LOCK_KEY = "pob:sched:lock"
+RUN_JOB_TASK = "worker.tasks.run_job"  # what RQ runs for a dispatched job unless submit() says otherwise
+
+# Extra time an active slot is held past its RQ timeout before it is
+# considered leaked (worker killed without reaching release()).
+ACTIVE_GRACE_SECONDS = 120
+# Seconds of predicted run one second of waiting is worth: a job can only be
+# overtaken by smaller ones queued less than (size difference / AGING_WEIGHT)
+# seconds after it.
+AGING_WEIGHT = 1.0
+
+
+def _score(cost: float, queued_at: float) -> float:
+    # Shortest first, aged by queue time; equal sizes stay FIFO.
+    return cost + AGING_WEIGHT * queued_at
+
+
+def submit(conn, queue, job_id: str, account: str, vessels: list[str], rows: int, timeout: int,
+           predicted: float = None, task: str = RUN_JOB_TASK, queued_at: float = None):
+    """
+    Queue a job; it is ordered by predicted seconds, or by rows without a
+    prediction, aged from queued_at (now by default; a requeued job passes
+    its first one). Once dispatched, RQ runs task(job_id), which must release().
+    """
+    now = queued_at or time.time()
+    meta = {
+        "task": task,
+        "account": account,
+        "vessels": list(vessels),
+        "rows": rows,
+        "timeout": timeout,
+        "predicted": predicted,
+        "queued_at": now,
+    }
+    pipe = conn.pipeline()
+    pipe.hset(META_KEY, job_id, json.dumps(meta))
+    pipe.zadd(PENDING_KEY, {job_id: _score(rows if predicted is None else predicted, now)})
+    pipe.execute()
+    dispatch(conn, queue)
+
+
+def release(conn, job_id: str):
+    """Free the account slot and vessel locks held by a finished job."""
+    conn.hdel(ACTIVE_KEY, job_id)
+
+
+def _load_active(conn) -> dict:
+    now = time.time()
+    active = {}
+    for raw_id, raw in conn.hgetall(ACTIVE_KEY).items():
+        job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+        item = json.loads(raw)
+        if item["expires_at"] < now:
+            conn.hdel(ACTIVE_KEY, job_id)
+            continue
+        active[job_id] = item
+    return active
+
+
+def dispatch(conn, queue) -> list[str]:
+    """Move every job that can run now from the pending set onto RQ."""
+    started = []
+    limit = portal_health.max_sessions(conn, PORTAL_MAX_SESSIONS)
+    if limit == 0:
+        return started
+    try:
+        with conn.lock(LOCK_KEY, timeout=30, blocking_timeout=10):
+            active = _load_active(conn)
+            busy_vessels = set()
+            sessions = {}
+            for item in active.values():
+                busy_vessels.update(item["vessels"])
+                sessions[item["account"]] = sessions.get(item["account"], 0) + 1
+
+            # Vessels of running jobs, then of every pending job passed over:
+            # lower-ranked jobs touching them wait their turn
+            for raw_id in conn.zrange(PENDING_KEY, 0, -1):
+                job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+                raw = conn.hget(META_KEY, job_id)
+                if raw is None:
+                    conn.zrem(PENDING_KEY, job_id)
+                    continue
+                meta = json.loads(raw)
+
+                if sessions.get(meta["account"], 0) >= limit or busy_vessels.intersection(meta["vessels"]):
+                    busy_vessels.update(meta["vessels"])
+                    continue
+
+                item = {
+                    "account": meta["account"],
+                    "vessels": meta["vessels"],
+                    "predicted": meta.get("predicted"),
+                    "started_at": time.time(),
+                    "expires_at": time.time() + meta["timeout"] + ACTIVE_GRACE_SECONDS,
+                }
+                pipe = conn.pipeline()
+                pipe.hset(ACTIVE_KEY, job_id, json.dumps(item))
+                pipe.zrem(PENDING_KEY, job_id)
+                pipe.hdel(META_KEY, job_id)
+                pipe.execute()
+                queue.enqueue(meta.get("task", RUN_JOB_TASK), job_id, job_timeout=meta["timeout"])
+
+                busy_vessels.update(meta["vessels"])
+                sessions[meta["account"]] = sessions.get(meta["account"], 0) + 1
+                started.append(job_id)
+    except LockError:
+        # Another process is dispatching; the periodic tick picks up anything missed.
+        pass
+    return started
+
+
+def scheduled(conn, job_id: str) -> bool:
+    """True while job_id is pending or holds a slot."""
+    return conn.zscore(PENDING_KEY, job_id) is not None or bool(conn.hexists(ACTIVE_KEY, job_id))
+
+
+def coalesce_candidates(conn, account: str, vessels: list[str]) -> list[str]:
+    """Pending jobs for exactly these vessels on this account, in dispatch order."""
+    wanted = sorted(vessels)
+    found = []
+    for raw_id in conn.zrange(PENDING_KEY, 0, -1):
+        job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+        raw = conn.hget(META_KEY, job_id)
+        if raw is None:
+            continue
+        meta = json.loads(raw)
+        if (meta.get("task", RUN_JOB_TASK) == RUN_JOB_TASK and meta["account"] == account
+                and sorted(meta["vessels"]) == wanted):
+            found.append(job_id)
+    return found
+
+
+def claim(conn, job_id: str) -> bool:
+    """
+    Take a pending job out of the queue so it can run inside another job's
+    portal session. False if it was dispatched or claimed in the meantime.
+    """
+    if not conn.zrem(PENDING_KEY, job_id):
+        return False
+    conn.hdel(META_KEY, job_id)
+    return True
+
+
+def position(conn, job_id: str):
+    """0-based place in the pending order, or None once dispatched."""
+    return conn.zrank(PENDING_KEY, job_id)
+
+
+def wait_seconds(conn, job_id: str):
+    """
+    Rough time until a pending job starts: the predicted work ahead of it
+    (pending jobs before it plus what is left of running ones) spread over
+    PORTAL_MAX_SESSIONS sessions. None once dispatched or without predictions.
+    """
+    rank = conn.zrank(PENDING_KEY, job_id)
+    if rank is None:
+        return None
+    now = time.time()
+    ahead = 0.0
+    for item in _load_active(conn).values():
+        if item.get("predicted") is not None:
+            ahead += max(0.0, item["predicted"] - (now - item["started_at"]))
+    for raw_id in conn.zrange(PENDING_KEY, 0, rank - 1) if rank else []:
+        raw = conn.hget(META_KEY, raw_id)
+        if raw is None:
+            continue
+        predicted = json.loads(raw).get("predicted")
+        if predicted is not None:
+            ahead += predicted
+    return ahead / max(1, portal_health.max_sessions(conn, PORTAL_MAX_SESSIONS))
+
+
+def queue_stats(conn) -> dict:
+    """Pending and running job counts, for the metrics endpoint."""
+    return {"pending": conn.zcard(PENDING_KEY), "active": len(_load_active(conn))}
@@ -1,21 +1,34 @@
-import os, uuid, secrets, time
+import asyncio, io, os, uuid, secrets, time, json, shutil, hashlib
+_IMPORT_STARTED = time.perf_counter()
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
-from redis import Redis
 from rq import Queue
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.schedulers.base import STATE_RUNNING
-
-from app.settings import DATA_DIR, REDIS_URL, APP_USERNAME, APP_PASSWORD
-from app.vessels import VESSELS
+from app.settings import (
+    DATA_DIR, APP_USERNAME, APP_PASSWORD, POB_USERNAME, VESSEL_SYNC_MAX_AGE_HOURS,
+    RESULT_CACHE_SECONDS, STEP_HISTORY_DAYS, NED_HISTORY_DAYS, RUN_SCHEDULER, SCHEDULER_LOCK_TTL_SECONDS
+)
+from app.vessels import get_catalog
+from app.redis_conn import get_redis
 from app.db import (
-    init_db, create_job, get_job, get_job_by_token, delete_job_files_and_row
+    init_db, ping_db, create_job, get_job, get_job_by_token, delete_job_files_and_row,
+    create_alias_job, find_job_by_fingerprint, resolve_job, list_jobs_updated_before,
+    gc_artifacts, artifact_usage, list_ned_results, has_ned_results,
+    top_failed_neds, prune_step_timings, prune_ned_results
+)
+from app.excel_utils import (
+    read_headers, read_columns, read_rows_as_dicts, write_failed_rows, iter_failed_rows_csv,
+    prune_parse_cache
 )
-from app.excel_utils import read_headers
+from app.preflight import SAMPLE_LIMIT, normalize_ned, run_preflight, summarize
+from app.estimates import predict_seconds, job_timeout, remaining_seconds
+from app import job_scheduler, artifacts, portal_health, status_cache
+from app.scheduler_lease import SchedulerLease, holder as scheduler_holder
 
 
 # -----------------------
@@ -23,25 +36,28 @@ from app.excel_utils import read_headers
 # -----------------------
 RETENTION_SECONDS = 6 * 3600     # keep files for 6 hours
 CLEANUP_EVERY_MINUTES = 10       # run cleanup every 10 minutes
+DISPATCH_EVERY_SECONDS = 30      # safety-net scheduler tick
+VESSEL_SYNC_CHECK_MINUTES = 60   # how often to check the vessel catalog's age
+VESSEL_SYNC_JOB_ID = "vessel-sync"     # scheduler id of the catalog sync
+VESSEL_SYNC_TIMEOUT_SECONDS = 60 * 10
+VESSEL_SYNC_PREDICTED_SECONDS = 60     # a login and one dropdown read
+STATUS_LONG_POLL_MAX_SECONDS = 30
+STATUS_LONG_POLL_STEP_SECONDS = 0.5
 
 
-def redis_from_url(url: str) -> Redis:
-    import urllib.parse
-    u = urllib.parse.urlparse(url)
-    db = int((u.path or "/0").replace("/", "") or "0")
-    
-    # Check if using SSL (rediss://)
-    use_ssl = u.scheme == "rediss"
-    
-    return Redis(
-        host=u.hostname or "localhost",
-        port=u.port or 6379,
-        db=db,
-        password=u.password,
-        ssl=use_ssl,
-        ssl_cert_reqs=None if use_ssl else None,
-        decode_responses=False
-    )
+def sync_vessels_if_stale():
+    """
+    Queue a catalog sync when no job session has refreshed it recently. It
+    logs in like a job, so it waits for a portal session slot in the scheduler.
+    """
+    catalog = get_catalog(force=True)
+    if catalog.synced_at is not None and time.time() - catalog.synced_at <= VESSEL_SYNC_MAX_AGE_HOURS * 3600:
+        return
+    if job_scheduler.scheduled(r, VESSEL_SYNC_JOB_ID):
+        return
+    job_scheduler.submit(r, q, VESSEL_SYNC_JOB_ID, account=POB_USERNAME, vessels=[], rows=0,
+                         timeout=VESSEL_SYNC_TIMEOUT_SECONDS, predicted=VESSEL_SYNC_PREDICTED_SECONDS,
+                         task="worker.tasks.sync_vessels")
 
 
 def require_app_login(username: str, password: str):
@@ -51,14 +67,20 @@ def require_app_login(username: str, password: str):
 
 def cleanup_old_jobs():
     """
-    Delete job folders (and DB rows) older than RETENTION_SECONDS.
-    Assumes each job has its own folder: DATA_DIR/<job_id>/
+    Delete jobs (DB rows, job folders, artifact references) not updated for
+    RETENTION_SECONDS. Artifacts whose last reference went away are removed
+    with them; folders without a DB row are swept by age.
     """
     now = time.time()
     os.makedirs(DATA_DIR, exist_ok=True)
 
+    for job_id in list_jobs_updated_before(now - RETENTION_SECONDS):
+        # Aliases go with their source; their cached documents too
+        for deleted_id in delete_job_files_and_row(job_id):
+            status_cache.forget(r, deleted_id)
+
     for name in os.listdir(DATA_DIR):
-        if name == "tmp":
+        if name in ("tmp", "artifacts", "parse_cache"):
             continue
 
         path = os.path.join(DATA_DIR, name)
@@ -66,40 +88,100 @@ def cleanup_old_jobs():
             continue
 
         age = now - os.path.getmtime(path)
-        if age > RETENTION_SECONDS:
-            # Your existing helper should delete files + db row
-            delete_job_files_and_row(name)
+        if age > RETENTION_SECONDS and not get_job(name):
+            shutil.rmtree(path, ignore_errors=True)
 
+    gc_artifacts()
+    prune_parse_cache(RETENTION_SECONDS)
+    prune_step_timings(now - STEP_HISTORY_DAYS * 86400)
+    prune_ned_results(now - NED_HISTORY_DAYS * 86400)
 
-# -----------------------
-# App setup
-# -----------------------
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory="app/templates")
 
-init_db()
-os.makedirs(DATA_DIR, exist_ok=True)
+def _leader_only(task):
+    def run():
+        if lease.held:
+            task()
+    return run
 
-r = redis_from_url(REDIS_URL)
-q = Queue("pob", connection=r)
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(cleanup_old_jobs, trigger="interval", minutes=CLEANUP_EVERY_MINUTES)
+def start_scheduler():
+    """
+    Periodic cleanup, dispatch, portal probe and catalog checks. Every
+    RUN_SCHEDULER process runs the loop, but only the holder of the
+    scheduler lease does the work.
+    """
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(lease.renew, trigger="interval", seconds=max(1, SCHEDULER_LOCK_TTL_SECONDS // 3))
+    scheduler.add_job(_leader_only(cleanup_old_jobs), trigger="interval", minutes=CLEANUP_EVERY_MINUTES)
+    scheduler.add_job(_leader_only(lambda: job_scheduler.dispatch(r, q)),
+                      trigger="interval", seconds=DISPATCH_EVERY_SECONDS)
+    # Only probes while the portal breaker is open; a good probe lets dispatch resume
+    scheduler.add_job(_leader_only(lambda: portal_health.probe_if_due(r)),
+                      trigger="interval", seconds=DISPATCH_EVERY_SECONDS)
+    scheduler.add_job(_leader_only(sync_vessels_if_stale), trigger="interval", minutes=VESSEL_SYNC_CHECK_MINUTES)
+    lease.renew()
+    scheduler.start()
+    return scheduler
+
+
+def _process_age_seconds():
+    """Seconds since this process was exec'd (Linux), covering interpreter and uvicorn startup."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 2)
+    except (OSError, ValueError, IndexError):
+        return None
 
 
-@app.on_event("startup")
-def on_startup():
-    # Start scheduler once
-    if scheduler.state != STATE_RUNNING:
-        scheduler.start()
+# Cold-start timings, reported by /readyz and /api/metrics
+STARTUP = {"ready": False, "import_seconds": None, "startup_seconds": None, "process_seconds": None,
+           "ready_at": None, "scheduler": RUN_SCHEDULER}
 
 
-@app.on_event("shutdown")
-def on_shutdown():
-    # Clean shutdown
-    if scheduler.state == STATE_RUNNING:
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    init_db()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    try:
+        # Open the first pooled connection now rather than on the first request
+        r.ping()
+    except Exception as e:
+        print(f"[web] Redis not reachable yet: {e}")
+    scheduler = start_scheduler() if RUN_SCHEDULER else None
+
+    STARTUP.update(
+        ready=True,
+        startup_seconds=round(time.perf_counter() - started, 3),
+        process_seconds=_process_age_seconds(),
+        ready_at=time.time(),
+    )
+    print(f"[web] ready: imports {STARTUP['import_seconds']}s, startup {STARTUP['startup_seconds']}s, "
+          f"since process start {STARTUP['process_seconds']}s, scheduler {('leader' if lease.held else 'standby') if scheduler else 'off'}")
+    yield
+    if scheduler is not None:
         scheduler.shutdown(wait=False)
+        # Let another process take over without waiting for the TTL
+        lease.release()
+
+
+# -----------------------
+# App setup
+# -----------------------
+app = FastAPI(lifespan=lifespan)
+app.mount("/static", StaticFiles(directory="app/static"), name="static")
+templates = Jinja2Templates(directory="app/templates")
+
+# Clients on the shared pool; no connection is made until first use
+r = get_redis()
+q = Queue("pob", connection=r)
+lease = SchedulerLease(r, SCHEDULER_LOCK_TTL_SECONDS)
+STARTUP["import_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
 
 
 # -----------------------
@@ -107,7 +189,7 @@ def on_shutdown():
 # -----------------------
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request, "vessels": VESSELS})
+    return templates.TemplateResponse("index.html", {"request": request, "vessels": get_catalog().names()})
 
 
 @app.post("/api/excel/headers")
@@ -135,76 +217,419 @@ async def api_headers(
     return {"headers": headers}
 
 
-@app.post("/api/jobs")
-async def create_job_api(
+def _sheet_columns(path: str, col: str, vessel_col: str = ""):
+    """NED values (and vessel values when vessel_col is set) of an uploaded sheet."""
+    header, columns = read_columns(path, [col] + ([vessel_col] if vessel_col else []))
+    if col not in header:
+        raise HTTPException(status_code=400, detail=f"Column not found: {col}")
+    if vessel_col and vessel_col not in header:
+        raise HTTPException(status_code=400, detail=f"Vessel column not found: {vessel_col}")
+    return columns[col], columns.get(vessel_col)
+
+
+def job_fingerprint(data1: bytes, data2: bytes, vessel, col1, col2, vessel_col1, vessel_col2) -> str:
+    """Identity of a submission: both upload contents plus every option that affects the run."""
+    parts = [hashlib.sha256(data1).hexdigest(), hashlib.sha256(data2).hexdigest(),
+             vessel, col1, col2, vessel_col1, vessel_col2]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def _reusable(job) -> str:
+    """How a duplicate submission may reuse job: 'attached', 'cached' or None."""
+    if not job:
+        return None
+    if job["status"] in ("QUEUED", "RUNNING"):
+        return "attached"
+    if job["status"] == "COMPLETED" and time.time() - job["updated_at"] <= RESULT_CACHE_SECONDS:
+        return "cached"
+    return None
+
+
+@app.post("/api/preflight")
+async def preflight_api(
     app_username: str = Form(...),
     app_password: str = Form(...),
-    vessel: str = Form(...),
     col1: str = Form(...),
     col2: str = Form(...),
     excel1: UploadFile = File(...),
     excel2: UploadFile = File(...)
 ):
+    """Blank, duplicate and cross-list NED report, answered without touching the portal."""
     require_app_login(app_username, app_password)
+    data1, data2 = await excel1.read(), await excel2.read()
+    # Parsing blocks; see create_job_api
+    return await run_in_threadpool(_preflight, col1, col2, excel1.filename, data1, excel2.filename, data2)
 
-    if vessel not in VESSELS:
-        raise HTTPException(status_code=400, detail="Invalid vessel")
-
-    job_id = str(uuid.uuid4())
-    token = secrets.token_urlsafe(24)
 
-    job_dir = os.path.join(DATA_DIR, job_id)
+def _preflight(col1: str, col2: str, filename1: str, data1: bytes, filename2: str, data2: bytes) -> dict:
+    job_dir = os.path.join(DATA_DIR, "tmp")
     os.makedirs(job_dir, exist_ok=True)
+    p1 = os.path.join(job_dir, f"{uuid.uuid4()}_{filename1}")
+    p2 = os.path.join(job_dir, f"{uuid.uuid4()}_{filename2}")
+    try:
+        for path, data in ((p1, data1), (p2, data2)):
+            with open(path, "wb") as f:
+                f.write(data)
+        return summarize(_sheet_columns(p1, col1)[0], _sheet_columns(p2, col2)[0])
+    finally:
+        for p in (p1, p2):
+            try:
+                os.remove(p)
+            except:
+                pass
+
+
+def _sheet_vessels(values, vessel_values, default: str) -> tuple:
+    """
+    Distinct vessel names used by the rows of a sheet that have a NED (blank
+    cells fall back to default), and the Excel row numbers left without one.
+    """
+    found, missing = set(), []
+    for i, value in enumerate(values):
+        if not normalize_ned(value):
+            continue
+        name = default
+        if vessel_values is not None:
+            v = vessel_values[i]
+            name = ("" if v is None else str(v).strip()) or default
+        if name:
+            found.add(name)
+        else:
+            missing.append(i + 2)    # header is row 1
+    return found, missing
+
+
+def _rows_by_vessel(values1, vessel_values1, values2, vessel_values2, default, catalog) -> dict:
+    """{vessel: [off, on]} portal searches, counted the way the worker merges lists."""
+    counts = {}
+    for which, values, vessel_values in ((0, values1, vessel_values1), (1, values2, vessel_values2)):
+        seen = set()
+        for i, value in enumerate(values):
+            ned = normalize_ned(value)
+            name = default
+            if vessel_values is not None:
+                name = "" if vessel_values[i] is None else str(vessel_values[i]).strip()
+                entry = catalog.resolve(name or default)
+                name = entry["name"] if entry else name
+            if not ned or not name or (name, ned) in seen:
+                continue
+            seen.add((name, ned))
+            counts.setdefault(name, [0, 0])[which] += 1
+    return counts
 
-    p1 = os.path.join(job_dir, f"return_manifest_{excel1.filename}")
-    p2 = os.path.join(job_dir, f"rfm_{excel2.filename}")
-
-    with open(p1, "wb") as f:
-        f.write(await excel1.read())
-    with open(p2, "wb") as f:
-        f.write(await excel2.read())
-
-    create_job(job_id, token, p1, p2, col1, col2, vessel)
 
-    q.enqueue("worker.tasks.run_job", job_id, job_timeout=60 * 30)  # 30 min
-    return {"job_id": job_id}
+@app.post("/api/jobs")
+async def create_job_api(
+    app_username: str = Form(...),
+    app_password: str = Form(...),
+    vessel: str = Form(""),
+    col1: str = Form(...),
+    col2: str = Form(...),
+    excel1: UploadFile = File(...),
+    excel2: UploadFile = File(...),
+    vessel_col1: str = Form(""),
+    vessel_col2: str = Form("")
+):
+    require_app_login(app_username, app_password)
+    data1, data2 = await excel1.read(), await excel2.read()
+    # Parsing, SQLite and the scheduler lock block; keep them off the event
+    # loop so status long-polls are not held up
+    return await run_in_threadpool(_create_job, vessel, col1, col2, vessel_col1, vessel_col2,
+                                   excel1.filename, data1, excel2.filename, data2)
+
+
+def _create_job(vessel: str, col1: str, col2: str, vessel_col1: str, vessel_col2: str,
+                filename1: str, data1: bytes, filename2: str, data2: bytes) -> dict:
+    multi = bool(vessel_col1 or vessel_col2)
+    catalog = get_catalog()
+    if vessel:
+        entry = catalog.resolve(vessel)
+        if not entry:
+            raise HTTPException(status_code=400, detail="Invalid vessel")
+        vessel = entry["name"]
+    elif not multi:
+        raise HTTPException(status_code=400, detail="Invalid vessel")
 
+    job_id = str(uuid.uuid4())
+    token = secrets.token_urlsafe(24)
 
-@app.get("/api/jobs/{job_id}")
-def job_status(job_id: str, app_username: str, app_password: str):
-    require_app_login(app_username, app_password)
-    job = get_job(job_id)
+    fingerprint = job_fingerprint(data1, data2, vessel, col1, col2, vessel_col1, vessel_col2)
+    source = find_job_by_fingerprint(fingerprint)
+    reuse = _reusable(source)
+    if reuse:
+        # Same files and options as a job that is running or just finished: reuse it
+        create_alias_job(job_id, token, source, reuse)
+        return {"job_id": job_id, "vessels": source["vessels"], "reuse": reuse,
+                "source_job_id": source["job_id"]}
+
+    # Uploads go to the content-addressed store: identical manifests are kept once
+    a1 = artifacts.put_bytes(data1, filename1)
+    a2 = artifacts.put_bytes(data2, filename2)
+    p1, p2 = a1["path"], a2["path"]
+    values1, vessel_values1 = _sheet_columns(p1, col1, vessel_col1)
+    values2, vessel_values2 = _sheet_columns(p2, col2, vessel_col2)
+
+    if multi:
+        # Multi-vessel job: every row with a NED names its vessel; all must be known
+        names1, missing1 = _sheet_vessels(values1, vessel_values1, vessel)
+        names2, missing2 = _sheet_vessels(values2, vessel_values2, vessel)
+        if missing1 or missing2:
+            where = [f"{name} rows {', '.join(map(str, rows[:SAMPLE_LIMIT]))}"
+                     for name, rows in (("Return manifest", missing1), ("RFM", missing2)) if rows]
+            raise HTTPException(status_code=400,
+                                detail=f"No vessel for {'; '.join(where)}: fill the vessel cells or select a vessel")
+        names = names1 | names2
+        unknown = sorted(v for v in names if not catalog.resolve(v))
+        if unknown or not names:
+            detail = f"Unknown vessel(s): {', '.join(unknown)}" if unknown else "No vessels found in sheets"
+            raise HTTPException(status_code=400, detail=detail)
+        vessels = sorted({catalog.resolve(v)["name"] for v in names})
+    else:
+        vessels = [vessel]
+
+    pf = run_preflight(values1, values2)
+    # Unique, non-blank NEDs: the number of portal searches this job will cost
+    rows1, rows2 = len(pf["off"]["neds"]), len(pf["on"]["neds"])
+    predicted = predict_seconds(
+        _rows_by_vessel(values1, vessel_values1, values2, vessel_values2, vessel, catalog))
+    timeout = job_timeout(predicted)
+    create_job(job_id, token, p1, p2, col1, col2, vessel, rows1=rows1, rows2=rows2,
+               job_type="multi" if multi else "single", vessels=vessels,
+               vessel_col1=vessel_col1 or None, vessel_col2=vessel_col2 or None,
+               preflight=summarize(values1, values2, pf), fingerprint=fingerprint,
+               predicted_seconds=predicted, job_timeout=timeout)
+    artifacts.attach(job_id, "upload1", a1, f"return_manifest_{filename1}")
+    artifacts.attach(job_id, "upload2", a2, f"rfm_{filename2}")
+
+    job_scheduler.submit(r, q, job_id, account=POB_USERNAME, vessels=vessels,
+                         rows=rows1 + rows2, timeout=timeout, predicted=predicted)
+    return {"job_id": job_id, "vessels": vessels, "reuse": None, "source_job_id": None}
+
+
+def _status_state(job_id: str):
+    """
+    Cached job document, queue position, portal state and the ETag over
+    them, all from Redis (app.status_cache); None for an unknown job.
+    """
+    job = status_cache.load(r, job_id)
     if not job:
-        raise HTTPException(status_code=404, detail="Not found")
-
-    safe = {
+        return None
+    run_id = job.get("source_job_id") or job_id
+    position = job_scheduler.position(r, run_id) if job["status"] == "QUEUED" else None
+    portal = portal_health.get_state(r)
+    # ETA is derived from these; it alone changing does not make a new response
+    key = json.dumps([job["version"], position, portal["state"], portal["reason"]])
+    etag = '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+    return job, position, portal, etag
+
+
+def _status_body(job: dict, position, portal: dict) -> dict:
+    run_id = job.get("source_job_id") or job["job_id"]
+
+    # Seconds until the job finishes: queue wait plus its own run, or what is left of it
+    eta = None
+    if job["status"] == "QUEUED" and job.get("predicted_seconds") is not None:
+        wait = job_scheduler.wait_seconds(r, run_id)
+        eta = job["predicted_seconds"] + (wait or 0.0)
+    elif job["status"] == "RUNNING" and job.get("predicted_seconds") is not None:
+        eta = remaining_seconds(job)
+
+    has_results = job["has_results"]
+    if has_results and job.get("job_type") == "multi":
+        vessel_outputs = job["result_vessels"]
+    else:
+        vessel_outputs = sorted((job.get("outputs") or {}).keys())
+
+    return {
         "job_id": job["job_id"],
         "status": job["status"],
         "error": job["error"],
-        "has_outputs": bool(job.get("out1_path")) and bool(job.get("out2_path")),
-        "download_token": job["token"] if job["status"] == "COMPLETED" else None
+        "has_outputs": has_results or (bool(job.get("out1_path")) and bool(job.get("out2_path"))),
+        # A failed run still offers the rows it could not get through
+        "download_token": job["token"] if job["status"] == "COMPLETED"
+                          or (job["status"] == "FAILED" and has_results) else None,
+        "coalesced_into": job.get("coalesced_into"),
+        "job_type": job.get("job_type") or "single",
+        "vessels": job["vessels"],
+        "progress": job.get("progress"),
+        "vessel_outputs": vessel_outputs,
+        "preflight": job.get("preflight"),
+        "reuse": job.get("reuse"),
+        "source_job_id": job.get("source_job_id"),
+        "queue_position": position,
+        "predicted_seconds": job.get("predicted_seconds"),
+        "eta_seconds": round(eta) if eta is not None else None,
+        "eta_at": time.time() + eta if eta is not None else None,
+        "browser_memory": job.get("browser_memory"),
+        "portal": {"state": portal["state"], "reason": portal["reason"], "since": portal["since"]},
     }
-    return safe
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(request: Request, job_id: str, app_username: str, app_password: str, wait: int = 0):
+    """
+    Job status from the Redis status cache. With If-None-Match the answer is
+    304 while nothing changed; wait=N (seconds, at most STATUS_LONG_POLL_MAX_SECONDS)
+    holds that 304 back until the status changes or the time is up.
+    """
+    require_app_login(app_username, app_password)
+    deadline = time.monotonic() + min(max(wait, 0), STATUS_LONG_POLL_MAX_SECONDS)
+    while True:
+        state = await run_in_threadpool(_status_state, job_id)
+        if state is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        job, position, portal, etag = state
+        headers = {"etag": etag, "cache-control": "private, no-cache"}
+        if not artifacts.etag_matches(request, etag):
+            break
+        if time.monotonic() >= deadline or await request.is_disconnected():
+            return Response(status_code=304, headers=headers)
+        await asyncio.sleep(STATUS_LONG_POLL_STEP_SECONDS)
+
+    body = await run_in_threadpool(_status_body, job, position, portal)
+    return JSONResponse(body, headers=headers)
+
+
+FAILURE_REASON_HEADER = "Failure reason"
+EXPORT_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+
+
+def _failed_rows(job: dict, run_id: str, which: str, vessel: str):
+    """
+    Failed rows of one list, rebuilt from ned_results and the original upload.
+    Rows without a result (a run that stopped part-way) count as failed too.
+    Returns (header_row, rows, results_key); results_key changes whenever the
+    export would.
+    """
+    results = list_ned_results(run_id, which)
+    single = (job.get("job_type") or "single") != "multi"
+    by_row = {res["row_num"]: res for res in results}
+
+    upload = job["upload1_path"] if which == "excel1" else job["upload2_path"]
+    header_row, rows = read_rows_as_dicts(upload)
+    failed = []
+    for row_idx, row in enumerate(rows):
+        res = by_row.get(row_idx + 2)
+        if res is None:
+            if job["status"] == "COMPLETED" or (vessel and not single):
+                continue
+            reason = "not processed"
+        elif res["status"] == "ok" or (vessel and res["vessel"] != vessel):
+            continue
+        else:
+            reason = res["reason"] or "failed"
+        failed.append(dict(row, **{FAILURE_REASON_HEADER: reason}))
+
+    key = json.dumps([job["status"], upload, [(r["row_num"], r["status"], r["reason"]) for r in results]])
+    return header_row + [FAILURE_REASON_HEADER], failed, key
 
 
 @app.get("/download/{token}/{which}")
-def download(token: str, which: str, app_username: str, app_password: str):
+def download(request: Request, token: str, which: str, app_username: str, app_password: str,
+             vessel: str = "", format: str = "xlsx"):
     require_app_login(app_username, app_password)
 
-    job = get_job_by_token(token)
-    if not job or job["status"] != "COMPLETED":
+    job = resolve_job(get_job_by_token(token))
+    if not job or job["status"] not in ("COMPLETED", "FAILED"):
         raise HTTPException(status_code=404, detail="Not ready")
+    run_id = job.get("source_job_id") or job["job_id"]
 
     if which not in ("excel1", "excel2"):
         raise HTTPException(status_code=400, detail="Invalid file")
-
-    path = job["out1_path"] if which == "excel1" else job["out2_path"]
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid format")
+
+    suffix = f"_{vessel}" if vessel else ""
+    filename = f"{which}_failed_rows{suffix}.{format}"
+
+    if has_ned_results(run_id):
+        header_row, failed, key = _failed_rows(job, run_id, which, vessel)
+        etag = '"' + hashlib.sha256(f"{key}|{vessel}|{format}".encode()).hexdigest() + '"'
+        headers = {"etag": etag, "cache-control": "private, no-cache",
+                   "content-disposition": f'attachment; filename="{filename}"'}
+        if artifacts.etag_matches(request, etag):
+            return Response(status_code=304, headers={"etag": etag})
+        if format == "csv":
+            return StreamingResponse(iter_failed_rows_csv(header_row, failed),
+                                     media_type=EXPORT_MEDIA_TYPES["csv"], headers=headers)
+        buf = io.BytesIO()
+        write_failed_rows(buf, header_row, failed)
+        return Response(buf.getvalue(), media_type=EXPORT_MEDIA_TYPES["xlsx"], headers=headers)
+
+    # Jobs that finished before per-NED results were recorded have their files on disk
+    if job["status"] != "COMPLETED" or format != "xlsx":
+        raise HTTPException(status_code=404, detail="Missing output")
+    if vessel:
+        # Per-vessel failed rows of a multi-vessel job
+        path = (job.get("outputs") or {}).get(vessel, {}).get(which)
+    else:
+        path = job["out1_path"] if which == "excel1" else job["out2_path"]
     if not path or not os.path.exists(path):
         raise HTTPException(status_code=404, detail="Missing output")
 
     # IMPORTANT: Do NOT delete here. Option C cleanup will delete later.
-    return FileResponse(
-        path,
-        filename=os.path.basename(path),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    return artifacts.serve(request, path, filename=filename)
+
+
+@app.get("/api/stats/failed-neds")
+def failed_neds_stats(app_username: str, app_password: str, days: int = 7, limit: int = 20):
+    """NEDs that failed most often over the last `days` days."""
+    require_app_login(app_username, app_password)
+    since = time.time() - max(1, days) * 86400
+    return {"since": since, "neds": top_failed_neds(since, limit=max(1, min(limit, 500)))}
+
+
+@app.get("/readyz")
+def readyz():
+    """200 once startup finished and SQLite and Redis answer, 503 otherwise."""
+    checks = {}
+    for name, check in (("db", ping_db), ("redis", r.ping)):
+        try:
+            check()
+            checks[name] = "ok"
+        except Exception as e:
+            checks[name] = f"error: {e}"
+    ready = STARTUP["ready"] and all(v == "ok" for v in checks.values())
+    try:
+        holder = scheduler_holder(r)
+    except Exception:
+        holder = None
+    scheduler = {"enabled": RUN_SCHEDULER, "holder": holder, "this_process": lease.identity, "leader": lease.held}
+    return JSONResponse({"ready": ready, "checks": checks, "startup": STARTUP, "scheduler": scheduler},
+                        status_code=200 if ready else 503)
+
+
+@app.get("/api/metrics")
+def metrics(app_username: str, app_password: str):
+    """Portal health (breaker state, latencies, error rates), scheduler queue sizes and cold start."""
+    require_app_login(app_username, app_password)
+    return {"portal": portal_health.health(r), "queue": job_scheduler.queue_stats(r), "startup": STARTUP}
+
+
+@app.get("/api/workers")
+def workers_health(app_username: str, app_password: str):
+    """Per-host worker health as published by supervisor.py."""
+    require_app_login(app_username, app_password)
+    hosts = []
+    for key in r.scan_iter(match="pob:supervisor:*"):
+        raw = r.get(key)
+        if raw:
+            hosts.append(json.loads(raw))
+    return {"hosts": hosts}
+
+
+@app.get("/api/vessels")
+def vessels_api(app_username: str, app_password: str):
+    require_app_login(app_username, app_password)
+    catalog = get_catalog()
+    return {"vessels": catalog.names(), "synced_at": catalog.synced_at}
+
+
+@app.get("/api/artifacts")
+def artifacts_usage(app_username: str, app_password: str, limit: int = 100):
+    """Stored size, references and downloads per artifact, largest first."""
+    require_app_login(app_username, app_password)
+    return artifact_usage(limit=limit)
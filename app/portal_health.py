@@ -0,0 +1,197 @@
+"""
+Shared POB portal health and circuit breaker (state in Redis).
+
+Workers feed latency samples (page loads, NED searches, bulk actions) as
+they go. From the samples of the last PORTAL_HEALTH_WINDOW_SECONDS the
+breaker is
+  CLOSED    normal operation
+  DEGRADED  slow or erroring portal: the scheduler runs at most
+            PORTAL_DEGRADED_MAX_SESSIONS sessions and workers pause
+            PORTAL_DEGRADED_PACING_MS between NEDs
+  OPEN      portal down: nothing is dispatched, running jobs stop before
+            their next NED
+An OPEN breaker only closes through probe_if_due(): a plain HTTP GET of the
+login page from the web process, retried with backoff. A good probe moves
+it to DEGRADED so real traffic resumes carefully; healthy samples taken
+after that close it.
+"""
+import json, statistics, time, urllib.error, urllib.request
+
+from app.settings import (
+    POB_URL, PORTAL_HEALTH_WINDOW_SECONDS, PORTAL_DEGRADED_MAX_SESSIONS, PORTAL_DEGRADED_PACING_MS,
+    PORTAL_PROBE_INTERVAL_SECONDS
+)
+
+SAMPLES_KEY = "pob:portal:samples"    # list of json samples, newest first
+STATE_KEY = "pob:portal:breaker"      # json breaker state
+MAX_SAMPLES = 300
+
+CLOSED, DEGRADED, OPEN = "CLOSED", "DEGRADED", "OPEN"
+
+MIN_SAMPLES = 5                # fewer samples in the window: no decision
+OPEN_ERROR_RATE = 0.5
+DEGRADED_ERROR_RATE = 0.2
+OPEN_CONSECUTIVE_ERRORS = 4    # newest samples all failed -> open without waiting for the rate
+# Median latency (ms) above which a kind of request counts as slow
+SLOW_MS = {"page_load": 15000, "search": 12000, "bulk": 15000}
+PROBE_TIMEOUT_SECONDS = 10
+MAX_PROBE_INTERVAL_SECONDS = 600
+STATE_CACHE_SECONDS = 5
+
+
+def _default_state() -> dict:
+    return {"state": CLOSED, "since": None, "reason": None, "next_probe_at": None, "probe_failures": 0}
+
+
+def get_state(conn) -> dict:
+    try:
+        raw = conn.get(STATE_KEY)
+    except Exception:
+        return _default_state()
+    return json.loads(raw) if raw else _default_state()
+
+
+def _set_state(conn, state: str, reason: str, current: dict, **extra):
+    if state == current["state"] and not extra:
+        return current
+    now = time.time()
+    new = _default_state()
+    new.update(state=state, since=now if state != current["state"] else current["since"], reason=reason)
+    if state == OPEN:
+        new["next_probe_at"] = now + PORTAL_PROBE_INTERVAL_SECONDS
+    new.update(extra)
+    conn.set(STATE_KEY, json.dumps(new))
+    if state != current["state"]:
+        print(f"[portal] breaker {current['state']} -> {state}: {reason}")
+    return new
+
+
+def _samples(conn, since: float) -> list[dict]:
+    samples = [json.loads(s) for s in conn.lrange(SAMPLES_KEY, 0, -1)]
+    return [s for s in samples if s["at"] >= since]
+
+
+def summarize(samples: list[dict]) -> dict:
+    """Per kind: count, error rate and latency percentiles of successful requests."""
+    out = {}
+    for kind in SLOW_MS:
+        items = [s for s in samples if s["kind"] == kind]
+        ok_ms = sorted(s["ms"] for s in items if s["ok"])
+        out[kind] = {
+            "count": len(items),
+            "error_rate": round(sum(1 for s in items if not s["ok"]) / len(items), 3) if items else None,
+            "p50_ms": statistics.median(ok_ms) if ok_ms else None,
+            "p95_ms": ok_ms[min(len(ok_ms) - 1, int(len(ok_ms) * 0.95))] if ok_ms else None,
+        }
+    return out
+
+
+def _evaluate(samples: list[dict]):
+    """(state, reason) the samples call for, or None when there are too few."""
+    if len(samples) < MIN_SAMPLES:
+        return None
+    newest = samples[:OPEN_CONSECUTIVE_ERRORS]
+    if len(newest) == OPEN_CONSECUTIVE_ERRORS and not any(s["ok"] for s in newest):
+        return OPEN, f"last {OPEN_CONSECUTIVE_ERRORS} portal requests failed"
+    errors = sum(1 for s in samples if not s["ok"]) / len(samples)
+    if errors >= OPEN_ERROR_RATE:
+        return OPEN, f"{errors:.0%} of portal requests failed"
+    if errors >= DEGRADED_ERROR_RATE:
+        return DEGRADED, f"{errors:.0%} of portal requests failed"
+    for kind, stats in summarize(samples).items():
+        if stats["p50_ms"] is not None and stats["p50_ms"] > SLOW_MS[kind]:
+            return DEGRADED, f"median {kind} {stats['p50_ms'] / 1000:.1f}s"
+    return CLOSED, "portal healthy"
+
+
+def record_sample(conn, kind: str, ms: float, ok: bool):
+    """Add one measured request and move the breaker if the window calls for it."""
+    now = time.time()
+    pipe = conn.pipeline()
+    pipe.lpush(SAMPLES_KEY, json.dumps({"kind": kind, "ms": int(ms), "ok": bool(ok), "at": now}))
+    pipe.ltrim(SAMPLES_KEY, 0, MAX_SAMPLES - 1)
+    pipe.execute()
+
+    current = get_state(conn)
+    if current["state"] == OPEN:
+        return    # only a probe closes an open breaker
+    since = now - PORTAL_HEALTH_WINDOW_SECONDS
+    decision = _evaluate(_samples(conn, since))
+    if decision is None:
+        return
+    state, reason = decision
+    if state == CLOSED and current["state"] == DEGRADED:
+        # Relax only on evidence gathered since the portal degraded
+        decision = _evaluate(_samples(conn, max(since, current["since"] or 0)))
+        if decision is None or decision[0] != CLOSED:
+            return
+    _set_state(conn, state, reason, current)
+
+
+def probe_if_due(conn, url: str = POB_URL):
+    """Cheap reachability check while the breaker is open (web scheduler tick)."""
+    current = get_state(conn)
+    if current["state"] != OPEN or time.time() < (current["next_probe_at"] or 0):
+        return current
+    started = time.time()
+    try:
+        with urllib.request.urlopen(url, timeout=PROBE_TIMEOUT_SECONDS) as resp:
+            ok = resp.status < 500
+    except urllib.error.HTTPError as e:
+        ok = e.code < 500
+    except Exception as e:
+        ok = False
+        print(f"[portal] probe failed: {e}")
+    ms = (time.time() - started) * 1000
+
+    if ok and ms < SLOW_MS["page_load"]:
+        conn.delete(SAMPLES_KEY)
+        return _set_state(conn, DEGRADED, f"probe ok in {ms / 1000:.1f}s, resuming carefully", current)
+    failures = current["probe_failures"] + 1
+    delay = min(MAX_PROBE_INTERVAL_SECONDS, PORTAL_PROBE_INTERVAL_SECONDS * 2 ** failures)
+    return _set_state(conn, OPEN, current["reason"], current,
+                      since=current["since"], probe_failures=failures, next_probe_at=time.time() + delay)
+
+
+def max_sessions(conn, normal: int) -> int:
+    """Portal sessions the scheduler may run per account right now."""
+    state = get_state(conn)["state"]
+    if state == OPEN:
+        return 0
+    if state == DEGRADED:
+        return min(normal, PORTAL_DEGRADED_MAX_SESSIONS)
+    return normal
+
+
+def health(conn) -> dict:
+    """Breaker state plus the sample window summary, for status and metrics."""
+    samples = _samples(conn, time.time() - PORTAL_HEALTH_WINDOW_SECONDS)
+    return {**get_state(conn), "window_seconds": PORTAL_HEALTH_WINDOW_SECONDS, "requests": summarize(samples)}
+
+
+class PortalMonitor:
+    """Worker-side handle: records samples and caches the breaker state briefly."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._state = None
+        self._state_at = 0.0
+
+    def record(self, kind: str, ms: float, ok: bool):
+        try:
+            record_sample(self.conn, kind, ms, ok)
+        except Exception as e:
+            print(f"⚠ Could not record portal health sample: {e}")
+        self._state = None
+
+    def state(self) -> str:
+        if self._state is None or time.time() - self._state_at > STATE_CACHE_SECONDS:
+            self._state = get_state(self.conn)["state"]
+            self._state_at = time.time()
+        return self._state
+
+    def is_open(self) -> bool:
+        return self.state() == OPEN
+
+    def pacing_ms(self) -> int:
+        return PORTAL_DEGRADED_PACING_MS if self.state() == DEGRADED else 0
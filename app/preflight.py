@@ -0,0 +1,84 @@
+"""
+Pre-flight checks on the two NED lists, run before any browser starts.
+
+Every portal search costs seconds (a miss costs the full 20 s wait), so the
+lists are cleaned up front: Excel artefacts such as 12345.0 are normalized,
+blank cells are failed without a search, duplicates are searched once while
+keeping every original row, and NEDs present in both lists are flagged.
+"""
+import math, re
+
+SAMPLE_LIMIT = 50     # max items listed per category in summaries
+
+_TRAILING_ZEROS = re.compile(r"^(\d+)\.0+$")
+
+
+def normalize_ned(value) -> str:
+    """Canonical text for a NED cell: 12345.0 / "12345.0" / " 12345 " -> "12345"."""
+    if value is None or isinstance(value, bool):
+        return "" if value is None else str(value)
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ""
+        return str(int(value)) if value.is_integer() else str(value)
+
+    text = str(value).replace("\u00a0", " ")
+    text = " ".join(text.split()).lstrip("'")   # leading ' forces text in Excel
+    m = _TRAILING_ZEROS.match(text)
+    return m.group(1) if m else text
+
+
+def analyze_list(values: list) -> dict:
+    """
+    neds:        unique normalized NEDs, in first-seen order
+    rows:        rows[i] = every row index holding neds[i]
+    blank_rows:  row indices with no NED
+    duplicates:  {ned: occurrences} for NEDs seen more than once
+    """
+    neds, rows, index, blank_rows = [], [], {}, []
+    for row_idx, value in enumerate(values):
+        ned = normalize_ned(value)
+        if not ned:
+            blank_rows.append(row_idx)
+            continue
+        if ned in index:
+            rows[index[ned]].append(row_idx)
+            continue
+        index[ned] = len(neds)
+        neds.append(ned)
+        rows.append([row_idx])
+    duplicates = {ned: len(r) for ned, r in zip(neds, rows) if len(r) > 1}
+    return {"neds": neds, "rows": rows, "blank_rows": blank_rows, "duplicates": duplicates}
+
+
+def run_preflight(values1: list, values2: list) -> dict:
+    """Analyze the OFF (Excel 1) and ON (Excel 2) lists and find cross-list conflicts."""
+    off = analyze_list(values1)
+    on = analyze_list(values2)
+    conflicts = sorted(set(off["neds"]) & set(on["neds"]))
+    return {"off": off, "on": on, "conflicts": conflicts}
+
+
+def _list_summary(values: list, result: dict) -> dict:
+    return {
+        "rows": len(values),
+        "unique": len(result["neds"]),
+        "blank": len(result["blank_rows"]),
+        # Excel row numbers (header is row 1)
+        "blank_rows": [i + 2 for i in result["blank_rows"][:SAMPLE_LIMIT]],
+        "duplicate_count": sum(n - 1 for n in result["duplicates"].values()),
+        "duplicates": dict(list(result["duplicates"].items())[:SAMPLE_LIMIT]),
+    }
+
+
+def summarize(values1: list, values2: list, result: dict = None) -> dict:
+    """Compact, JSON-friendly report for the UI and the job row."""
+    result = result or run_preflight(values1, values2)
+    return {
+        "off": _list_summary(values1, result["off"]),
+        "on": _list_summary(values2, result["on"]),
+        "conflict_count": len(result["conflicts"]),
+        "conflicts": result["conflicts"][:SAMPLE_LIMIT],
+    }
@@ -0,0 +1,45 @@
+import urllib.parse
+from redis import ConnectionPool, Redis
+from redis.connection import SSLConnection
+
+from app.settings import REDIS_URL
+
+# One pool per URL per process: every client built from the same URL shares
+# its sockets (redis-py resets a pool in a forked child on first use).
+_POOLS = {}
+
+
+def _pool(url: str) -> ConnectionPool:
+    pool = _POOLS.get(url)
+    if pool is not None:
+        return pool
+
+    u = urllib.parse.urlparse(url)
+    db = int((u.path or "/0").replace("/", "") or "0")
+
+    # Check if using SSL (rediss://)
+    use_ssl = u.scheme == "rediss"
+
+    kwargs = dict(
+        host=u.hostname or "localhost",
+        port=u.port or 6379,
+        db=db,
+        password=u.password,
+        decode_responses=False,
+        socket_connect_timeout=5,
+        health_check_interval=30,
+    )
+    if use_ssl:
+        kwargs.update(connection_class=SSLConnection, ssl_cert_reqs=None)
+    pool = _POOLS[url] = ConnectionPool(**kwargs)
+    return pool
+
+
+def redis_from_url(url: str) -> Redis:
+    """Client on the process-wide pool for url; no connection is made until first use."""
+    return Redis(connection_pool=_pool(url))
+
+
+def get_redis() -> Redis:
+    """Client for REDIS_URL, the connection every process component shares."""
+    return redis_from_url(REDIS_URL)
@@ -0,0 +1,49 @@
+"""
+Which web process runs the periodic jobs (cleanup, dispatch tick, portal
+probe, catalog checks).
+
+Every web process with RUN_SCHEDULER on competes for one Redis lock with a
+TTL of SCHEDULER_LOCK_TTL_SECONDS. The holder renews it from its scheduler
+loop and runs the periodic jobs; the others keep trying, so a holder that
+dies is replaced once its lock expires.
+"""
+import os, socket, uuid
+
+from redis.exceptions import LockError, RedisError
+
+LEASE_KEY = "pob:sched:leader"    # lock value: identity of the holding process
+
+
+class SchedulerLease:
+    def __init__(self, conn, ttl: int):
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+        # APScheduler runs renew() on pool threads, so the token is not thread-local
+        self._lock = conn.lock(LEASE_KEY, timeout=ttl, thread_local=False)
+
+    def renew(self) -> bool:
+        """Extend the lock while held, otherwise try to take it. True if held."""
+        try:
+            if self.held:
+                self._lock.reacquire()
+            else:
+                self.held = self._lock.acquire(blocking=False, token=self.identity)
+        except (LockError, RedisError) as e:
+            if self.held:
+                print(f"[scheduler] lost the scheduler lock: {e}")
+            self.held = False
+        return self.held
+
+    def release(self):
+        if self.held:
+            self.held = False
+            try:
+                self._lock.release()
+            except (LockError, RedisError):
+                pass
+
+
+def holder(conn):
+    """Identity of the process running the periodic jobs, or None."""
+    raw = conn.get(LEASE_KEY)
+    return raw.decode() if isinstance(raw, bytes) else raw
@@ -6,6 +6,7 @@ load_dotenv()
 APP_USERNAME = os.getenv("APP_USERNAME", "admin")
 APP_PASSWORD = os.getenv("APP_PASSWORD", "password")
 
+POB_URL = os.getenv("POB_URL", "https://pob.ongc.co.in/login")
 POB_USERNAME = os.getenv("POB_USERNAME", "")
 POB_PASSWORD = os.getenv("POB_PASSWORD", "")
 
@@ -13,3 +14,49 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 DATA_DIR = os.getenv("DATA_DIR", "/tmp/pob_jobs")
 
 HEADLESS = os.getenv("HEADLESS", "true").lower() == "true"
+
+# Web processes elect one of them (Redis lock, see app/scheduler_lease.py) to
+# run the periodic cleanup/dispatch jobs; false keeps this one out of it
+RUN_SCHEDULER = os.getenv("RUN_SCHEDULER", "true").lower() == "true"
+SCHEDULER_LOCK_TTL_SECONDS = int(os.getenv("SCHEDULER_LOCK_TTL_SECONDS", "30"))
+
+# Worker supervisor (0 = derive from available memory)
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "0"))
+WORKER_MAX_CONCURRENCY = int(os.getenv("WORKER_MAX_CONCURRENCY", "4"))
+WORKER_MEMORY_MB = int(os.getenv("WORKER_MEMORY_MB", "700"))        # python + chromium per worker
+WEB_RESERVED_MEMORY_MB = int(os.getenv("WEB_RESERVED_MEMORY_MB", "300"))
+WORKER_SHUTDOWN_GRACE_SECONDS = int(os.getenv("WORKER_SHUTDOWN_GRACE_SECONDS", "120"))
+
+# Scheduler: max concurrent portal sessions per POB account
+PORTAL_MAX_SESSIONS = int(os.getenv("PORTAL_MAX_SESSIONS", "2"))
+
+# Coalescing: queued jobs for the same vessel that join a running job's session
+COALESCE_MAX_JOBS = int(os.getenv("COALESCE_MAX_JOBS", "4"))
+COALESCE_MAX_ROWS = int(os.getenv("COALESCE_MAX_ROWS", "150"))
+
+# Vessel catalog: re-sync from the portal when older than this
+VESSEL_SYNC_MAX_AGE_HOURS = int(os.getenv("VESSEL_SYNC_MAX_AGE_HOURS", "24"))
+# Direct location URL, e.g. https://pob.ongc.co.in/location/{value} (empty = use the dropdown)
+POB_LOCATION_URL = os.getenv("POB_LOCATION_URL", "")
+
+# Duplicate submissions reuse a completed identical job for this long
+RESULT_CACHE_SECONDS = int(os.getenv("RESULT_CACHE_SECONDS", "900"))
+
+# Job duration estimates: RQ timeout = prediction * factor + margin, clamped
+JOB_TIMEOUT_FACTOR = float(os.getenv("JOB_TIMEOUT_FACTOR", "1.5"))
+JOB_TIMEOUT_MARGIN_SECONDS = int(os.getenv("JOB_TIMEOUT_MARGIN_SECONDS", "300"))
+JOB_TIMEOUT_MIN_SECONDS = int(os.getenv("JOB_TIMEOUT_MIN_SECONDS", "300"))
+JOB_TIMEOUT_MAX_SECONDS = int(os.getenv("JOB_TIMEOUT_MAX_SECONDS", str(4 * 3600)))
+STEP_HISTORY_DAYS = int(os.getenv("STEP_HISTORY_DAYS", "30"))
+# Per-NED outcomes outlive their jobs for the failed-NED stats
+NED_HISTORY_DAYS = int(os.getenv("NED_HISTORY_DAYS", "30"))
+
+# Portal health circuit breaker (see app/portal_health.py)
+PORTAL_HEALTH_WINDOW_SECONDS = int(os.getenv("PORTAL_HEALTH_WINDOW_SECONDS", "300"))
+PORTAL_DEGRADED_MAX_SESSIONS = int(os.getenv("PORTAL_DEGRADED_MAX_SESSIONS", "1"))
+PORTAL_DEGRADED_PACING_MS = int(os.getenv("PORTAL_DEGRADED_PACING_MS", "1500"))
+PORTAL_PROBE_INTERVAL_SECONDS = int(os.getenv("PORTAL_PROBE_INTERVAL_SECONDS", "60"))
+
+# Browser memory watchdog: recycle the page's context past these (0 = no limit)
+BROWSER_RECYCLE_RENDERER_MB = int(os.getenv("BROWSER_RECYCLE_RENDERER_MB", "350"))
+BROWSER_RECYCLE_JS_HEAP_MB = int(os.getenv("BROWSER_RECYCLE_JS_HEAP_MB", "150"))
@@ -0,0 +1,367 @@
+"""
+Spreadsheet readers, picked by file type (reader_for).
+
+Every reader answers three questions about the first sheet of a file:
+  headers(src)          header row (row 1), blanks kept as ""
+  columns(src, names)   header row, data row count, {name: values} for only
+                        the named columns
+  rows(src)             header row and every data row as a list of values
+
+src is a path or a binary file object. Data rows are rows 2.. of the sheet.
+
+  OpenpyxlReader  load_workbook(read_only=True); applies number formats
+                  (dates come back as datetime). Used for full-row reads.
+  XlsxXmlReader   streams the sheet XML and only converts the cells of the
+                  wanted columns. Numbers are returned as stored, so a date
+                  cell is its serial number; good for NED/vessel columns.
+  CsvReader       streaming csv module; every value is text, blank -> None.
+
+xlsx row counts follow openpyxl's read-only rules (gaps filled with empty
+rows, up to the last stored row; rows past the sheet <dimension> dropped,
+padding up to its end instead) so row N means the same thing whichever
+xlsx reader produced it; tests/test_sheet_readers.py holds the two to
+that. CSV drops trailing blank lines. openpyxl is only imported by
+OpenpyxlReader, so the other readers start without it.
+"""
+import codecs, csv, io, posixpath, string, zipfile
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+SNIFF_BYTES = 64 * 1024
+
+
+def _local(tag: str) -> str:
+    # Transitional and strict OOXML use different namespaces; match on the local name
+    return tag.rsplit("}", 1)[-1]
+
+
+class _LocalNames(dict):
+    """Tag -> local name ("x:row" -> "row"), memoized; expat reports prefixed names."""
+    def __missing__(self, name):
+        local = self[name] = name.rpartition(":")[2]
+        return local
+
+
+class _StopSheet(Exception):
+    pass
+
+
+def _column_index(letters: str) -> int:
+    """1-based column number of "A", "AB", ... (openpyxl's column_index_from_string)."""
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def _dimension(ref: str) -> tuple:
+    """(max_col, max_row) of a <dimension ref="A1:C10">; None where the ref leaves it open."""
+    last = ref.split(":")[-1].replace("$", "")
+    letters = last.rstrip(string.digits)
+    digits = last[len(letters):]
+    return (_column_index(letters) if letters else None), (int(digits) if digits else None)
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _column_map(header_row: list, names) -> dict:
+    """{name: 0-based column} for the wanted names; a repeated header keeps its last column."""
+    wanted = set(names)
+    return {h: i for i, h in enumerate(header_row) if h in wanted}
+
+
+class OpenpyxlReader:
+    name = "openpyxl"
+
+    def _sheet(self, src):
+        from openpyxl import load_workbook
+        wb = load_workbook(src, read_only=True, data_only=True)
+        return wb, wb.worksheets[0]
+
+    def headers(self, src) -> list:
+        wb, ws = self._sheet(src)
+        try:
+            return [_text(c.value) for c in ws[1]]
+        finally:
+            wb.close()
+
+    def columns(self, src, names) -> tuple:
+        header_row, rows = self.rows(src)
+        found = _column_map(header_row, names)
+        columns = {h: [r[i] if i < len(r) else None for r in rows] for h, i in found.items()}
+        return header_row, len(rows), columns
+
+    def rows(self, src) -> tuple:
+        wb, ws = self._sheet(src)
+        try:
+            header_row = [_text(c.value) for c in ws[1]]
+            rows = [list(r) for r in ws.iter_rows(min_row=2, values_only=True)]
+        finally:
+            wb.close()
+        return header_row, rows
+
+
+class XlsxXmlReader:
+    name = "xlsx-xml"
+
+    def _sheet_path(self, zf) -> str:
+        """Path of the first worksheet in workbook order (what wb.worksheets[0] opens)."""
+        try:
+            workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+            sheet = next(el for el in workbook.iter() if _local(el.tag) == "sheet")
+            rid = next(v for k, v in sheet.attrib.items() if _local(k) == "id")
+            rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+            target = next(el.get("Target") for el in rels if el.get("Id") == rid)
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+        except (KeyError, StopIteration, ET.ParseError):
+            return "xl/worksheets/sheet1.xml"
+
+    def _shared_strings(self, zf) -> list:
+        try:
+            src = zf.open("xl/sharedStrings.xml")
+        except KeyError:
+            return []
+        strings = []
+        with src:
+            for _event, el in ET.iterparse(src):
+                if _local(el.tag) != "si":
+                    continue
+                parts = []
+                for child in el:
+                    tag = _local(child.tag)
+                    if tag == "t":
+                        parts.append(child.text or "")
+                    elif tag == "r":
+                        parts.extend(t.text or "" for t in child if _local(t.tag) == "t")
+                strings.append("".join(parts))
+                el.clear()
+        return strings
+
+    @staticmethod
+    def _value(kind, raw, inline, shared):
+        # Same conversions as openpyxl's WorkSheetParser, minus number formats
+        if kind == "inlineStr":
+            return inline
+        if not raw:
+            # No <v>, or an empty one (a formula without a cached value)
+            return None
+        if kind == "s":
+            return shared[int(raw)]
+        if kind == "b":
+            return bool(int(raw))
+        if kind in ("str", "e", "d"):
+            return raw
+        if "." in raw or "E" in raw or "e" in raw:
+            return float(raw)
+        return int(raw)
+
+    def _parse(self, src, names=None, on_row=None):
+        """
+        Walk the sheet once, calling on_row(row number, {column: value}) for
+        each data row. names=None converts every cell; otherwise only the
+        cells under those headers. Without on_row it stops after the header.
+        Returns (header_row, n_rows).
+
+        Uses expat callbacks directly: no element objects are built, and the
+        text of cells outside the wanted columns is never collected.
+        """
+        with zipfile.ZipFile(src) as zf:
+            shared = self._shared_strings(zf)
+            st = {"max_row": None, "max_col": None, "row": 0, "last_row": 0, "header": [],
+                  "wanted": None, "values": None, "col": 0, "keep": False, "kind": "n",
+                  "text": None, "raw": None, "inline": None}
+            local = _LocalNames()
+
+            def start(name, attrs):
+                tag = local[name]
+                if tag == "c":
+                    ref = attrs.get("r")
+                    st["col"] = _column_index(ref.rstrip(string.digits)) if ref else st["col"] + 1
+                    st["keep"] = st["wanted"] is None or st["col"] in st["wanted"]
+                    st["kind"] = attrs.get("t", "n")
+                    st["raw"] = st["inline"] = None
+                elif not st["keep"]:
+                    if tag == "row":
+                        start_row(attrs)
+                    elif tag == "dimension":
+                        st["max_col"], st["max_row"] = _dimension(attrs["ref"])
+                elif tag == "v" or tag == "t":
+                    st["text"] = []
+
+            def start_row(attrs):
+                row_idx = int(attrs.get("r") or st["row"] + 1)
+                if st["max_row"] is not None and row_idx > st["max_row"]:
+                    st["last_row"] = st["max_row"]
+                    raise _StopSheet()
+                if row_idx > 1:
+                    if on_row is None:
+                        raise _StopSheet()
+                    if names is not None and st["wanted"] is None:
+                        st["wanted"] = {i + 1 for i in _column_map(st["header"], names).values()}
+                st["row"], st["values"], st["col"] = row_idx, {}, 0
+
+            def end(name):
+                tag = local[name]
+                if tag == "c":
+                    if st["keep"]:
+                        st["values"][st["col"]] = self._value(st["kind"], st["raw"], st["inline"], shared)
+                    st["keep"] = False
+                elif tag == "v" and st["text"] is not None:
+                    st["raw"], st["text"] = "".join(st["text"]), None
+                elif tag == "t" and st["text"] is not None:
+                    st["inline"], st["text"] = (st["inline"] or "") + "".join(st["text"]), None
+                elif tag == "row":
+                    end_row()
+
+            def end_row():
+                values = st["values"]
+                if st["row"] == 1:
+                    width = st["max_col"] or max(values, default=0)
+                    st["header"] = [_text(values.get(i)) for i in range(1, width + 1)]
+                    if on_row is None:
+                        raise _StopSheet()
+                elif st["row"] > 1:
+                    on_row(st["row"], values)
+                    st["last_row"] = st["row"]
+
+            def chars(data):
+                if st["text"] is not None:
+                    st["text"].append(data)
+
+            parser = expat.ParserCreate()
+            parser.buffer_text = True
+            parser.StartElementHandler = start
+            parser.EndElementHandler = end
+            parser.CharacterDataHandler = chars
+            with zf.open(self._sheet_path(zf)) as sheet:
+                try:
+                    parser.ParseFile(sheet)
+                except _StopSheet:
+                    pass
+        # Like openpyxl: the last stored row, or the dimension's last row when
+        # rows are stored past it
+        return st["header"], max(st["last_row"] - 1, 0)
+
+    def headers(self, src) -> list:
+        return self._parse(src)[0]
+
+    def columns(self, src, names) -> tuple:
+        by_column = {}
+
+        def on_row(row_idx, values):
+            for col_idx, value in values.items():
+                col = by_column.setdefault(col_idx, [])
+                col.extend([None] * (row_idx - 2 - len(col)))
+                col.append(value)
+
+        header_row, n_rows = self._parse(src, names=names, on_row=on_row)
+        columns = {}
+        for h, i in _column_map(header_row, names).items():
+            col = by_column.get(i + 1, [])
+            col.extend([None] * (n_rows - len(col)))
+            columns[h] = col[:n_rows]
+        return header_row, n_rows, columns
+
+    def rows(self, src) -> tuple:
+        rows = []
+
+        def on_row(row_idx, values):
+            rows.extend([] for _ in range(row_idx - 1 - len(rows)))
+            rows[-1] = [values.get(i) for i in range(1, max(values, default=0) + 1)]
+
+        header_row, n_rows = self._parse(src, on_row=on_row)
+        rows.extend([] for _ in range(n_rows - len(rows)))
+        width = max([len(header_row)] + [len(r) for r in rows])
+        return header_row, [r + [None] * (width - len(r)) for r in rows[:n_rows]]
+
+
+class CsvReader:
+    name = "csv"
+
+    def _iter_rows(self, src):
+        """
+        Stream csv rows. The encoding is picked from the first block: UTF-8
+        (with or without BOM), else Windows-1252 as Excel writes it.
+        """
+        f = open(src, "rb") if isinstance(src, str) else src
+        try:
+            sample = f.read(SNIFF_BYTES)
+            f.seek(0)
+            try:
+                codecs.getincrementaldecoder("utf-8-sig")().decode(sample, final=False)
+                encoding = "utf-8-sig"
+            except UnicodeDecodeError:
+                encoding = "cp1252"
+            text = io.TextIOWrapper(f, encoding=encoding, errors="replace", newline="")
+            try:
+                dialect = csv.Sniffer().sniff(text.read(4096), delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+            text.seek(0)
+            for row in csv.reader(text, dialect):
+                yield [v if v != "" else None for v in row]
+            text.detach()
+        finally:
+            if isinstance(src, str):
+                f.close()
+
+    def headers(self, src) -> list:
+        for row in self._iter_rows(src):
+            return [_text(v) for v in row]
+        return []
+
+    def columns(self, src, names) -> tuple:
+        header_row, found, columns = [], {}, {}
+        n_rows = last_used = 0
+        for idx, row in enumerate(self._iter_rows(src)):
+            if idx == 0:
+                header_row = [_text(v) for v in row]
+                found = _column_map(header_row, names)
+                columns = {h: [] for h in found}
+                continue
+            n_rows += 1
+            if any(v is not None for v in row):
+                last_used = n_rows
+            for h, i in found.items():
+                columns[h].append(row[i] if i < len(row) else None)
+        # Trailing blank lines are not rows
+        return header_row, last_used, {h: v[:last_used] for h, v in columns.items()}
+
+    def rows(self, src) -> tuple:
+        header_row, rows, last_used = [], [], 0
+        for idx, row in enumerate(self._iter_rows(src)):
+            if idx == 0:
+                header_row = [_text(v) for v in row]
+                continue
+            rows.append(row)
+            if any(v is not None for v in row):
+                last_used = len(rows)
+        return header_row, rows[:last_used]
+
+
+READERS = {
+    ".xlsx": XlsxXmlReader,
+    ".xlsm": XlsxXmlReader,
+    ".csv": CsvReader,
+}
+# Full-row reads keep openpyxl for xlsx so dates and number formats come out as before
+FULL_READERS = {
+    ".xlsx": OpenpyxlReader,
+    ".xlsm": OpenpyxlReader,
+    ".csv": CsvReader,
+}
+
+
+def file_type(path: str) -> str:
+    """Extension that picks the reader; store paths may carry a trailing .gz."""
+    name = path[:-3] if path.endswith(".gz") else path
+    ext = posixpath.splitext(name)[1].lower()
+    return ext if ext in READERS else ".xlsx"
+
+
+def reader_for(path: str, full: bool = False):
+    return (FULL_READERS if full else READERS)[file_type(path)]()
@@ -12,7 +12,18 @@ function setStatus(msg, kind) {
   if (kind) el.classList.add(kind);
 }
 
-async function loadHeaders(fileInputId, selectId) {
+function fillSelect(selectId, placeholder, headers) {
+  const sel = document.getElementById(selectId);
+  sel.innerHTML = `<option value="">${placeholder}</option>`;
+  for (const h of headers) {
+    const opt = document.createElement("option");
+    opt.value = h;
+    opt.textContent = h;
+    sel.appendChild(opt);
+  }
+}
+
+async function loadHeaders(fileInputId, selectId, vesselSelectId) {
   const appU = document.getElementById("app_username").value;
   const appP = document.getElementById("app_password").value;
   const file = document.getElementById(fileInputId).files[0];
@@ -26,19 +37,72 @@ async function loadHeaders(fileInputId, selectId) {
   setStatus("Reading headers…");
   const data = await postForm("/api/excel/headers", fd);
 
-  const sel = document.getElementById(selectId);
-  sel.innerHTML = `<option value="">Select column…</option>`;
-  for (const h of data.headers) {
-    const opt = document.createElement("option");
-    opt.value = h;
-    opt.textContent = h;
-    sel.appendChild(opt);
-  }
+  fillSelect(selectId, "Select column…", data.headers);
+  fillSelect(vesselSelectId, "None – use vessel below", data.headers);
   setStatus("Headers loaded.");
 }
 
-document.getElementById("excel1").addEventListener("change", () => loadHeaders("excel1","col1"));
-document.getElementById("excel2").addEventListener("change", () => loadHeaders("excel2","col2"));
+function progressText(progress) {
+  if (!progress) return "";
+  const parts = [];
+  for (const [vessel, p] of Object.entries(progress)) {
+    parts.push(`${vessel}: OFF ${p.off.done}/${p.off.total}, ON ${p.on.done}/${p.on.total}`);
+  }
+  return parts.length ? ` (${parts.join("; ")})` : "";
+}
+
+function etaText(seconds) {
+  if (seconds === null || seconds === undefined) return "";
+  const minutes = Math.max(1, Math.round(seconds / 60));
+  return ` – about ${minutes} min left`;
+}
+
+function portalText(portal) {
+  if (!portal || portal.state === "CLOSED") return "";
+  const label = portal.state === "OPEN" ? "portal unavailable, waiting" : "portal slow, running carefully";
+  return ` – ${label}${portal.reason ? ` (${portal.reason})` : ""}`;
+}
+
+async function runPreflight() {
+  const appU = document.getElementById("app_username").value;
+  const appP = document.getElementById("app_password").value;
+  const f1 = document.getElementById("excel1").files[0];
+  const f2 = document.getElementById("excel2").files[0];
+  const col1 = document.getElementById("col1").value;
+  const col2 = document.getElementById("col2").value;
+  if (!f1 || !f2 || !col1 || !col2) return;
+
+  const fd = new FormData();
+  fd.append("app_username", appU);
+  fd.append("app_password", appP);
+  fd.append("col1", col1);
+  fd.append("col2", col2);
+  fd.append("excel1", f1);
+  fd.append("excel2", f2);
+
+  try {
+    setStatus("Checking NED lists…");
+    const pf = await postForm("/api/preflight", fd);
+    const notes = [];
+    for (const [label, s] of [["Excel-1", pf.off], ["Excel-2", pf.on]]) {
+      notes.push(`${label}: ${s.unique} NEDs` +
+        (s.blank ? `, ${s.blank} blank` : "") +
+        (s.duplicate_count ? `, ${s.duplicate_count} duplicate` : ""));
+    }
+    if (pf.conflict_count) {
+      notes.push(`${pf.conflict_count} NED(s) in both lists: ${pf.conflicts.slice(0, 10).join(", ")}`);
+    }
+    setStatus(`Pre-flight: ${notes.join("; ")}`, pf.conflict_count ? "err" : "ok");
+  } catch (e) {
+    setStatus(e.message, "err");
+  }
+}
+
+document.getElementById("col1").addEventListener("change", runPreflight);
+document.getElementById("col2").addEventListener("change", runPreflight);
+
+document.getElementById("excel1").addEventListener("change", () => loadHeaders("excel1","col1","vcol1"));
+document.getElementById("excel2").addEventListener("change", () => loadHeaders("excel2","col2","vcol2"));
 
 document.getElementById("startBtn").addEventListener("click", async () => {
   try {
@@ -48,6 +112,8 @@ document.getElementById("startBtn").addEventListener("click", async () => {
     const vessel = document.getElementById("vessel").value;
     const col1 = document.getElementById("col1").value;
     const col2 = document.getElementById("col2").value;
+    const vcol1 = document.getElementById("vcol1").value;
+    const vcol2 = document.getElementById("vcol2").value;
 
     const f1 = document.getElementById("excel1").files[0];
     const f2 = document.getElementById("excel2").files[0];
@@ -55,7 +121,7 @@ document.getElementById("startBtn").addEventListener("click", async () => {
     if (!appU || !appP) throw new Error("Enter app username/password");
     if (!f1 || !f2) throw new Error("Upload both Excel files");
     if (!col1 || !col2) throw new Error("Select NED column for both files");
-    if (!vessel) throw new Error("Select vessel");
+    if (!vessel && !(vcol1 && vcol2)) throw new Error("Select vessel (or a vessel column for both files)");
 
     const fd = new FormData();
     fd.append("app_username", appU);
@@ -63,6 +129,8 @@ document.getElementById("startBtn").addEventListener("click", async () => {
     fd.append("vessel", vessel);
     fd.append("col1", col1);
     fd.append("col2", col2);
+    fd.append("vessel_col1", vcol1);
+    fd.append("vessel_col2", vcol2);
     fd.append("excel1", f1);
     fd.append("excel2", f2);
 
@@ -70,32 +138,64 @@ document.getElementById("startBtn").addEventListener("click", async () => {
     const created = await postForm("/api/jobs", fd);
     const jobId = created.job_id;
 
-    setStatus(`Queued: ${jobId}`);
+    if (created.reuse === "attached") {
+      setStatus(`Identical job already in progress, following it: ${created.source_job_id}`);
+    } else if (created.reuse === "cached") {
+      setStatus(`Identical job finished recently, reusing its results: ${created.source_job_id}`);
+    } else {
+      setStatus(`Queued: ${jobId}`);
+    }
     document.getElementById("downloads").classList.add("hidden");
 
+    // Long-poll: the server answers when the status changes (200) or after
+    // `wait` seconds with 304 Not Modified
+    let etag = null;
     const poll = async () => {
-      const url = `/api/jobs/${jobId}?app_username=${encodeURIComponent(appU)}&app_password=${encodeURIComponent(appP)}`;
-      const res = await fetch(url);
+      const url = `/api/jobs/${jobId}?wait=25&app_username=${encodeURIComponent(appU)}&app_password=${encodeURIComponent(appP)}`;
+      const res = await fetch(url, { headers: etag ? { "If-None-Match": etag } : {} });
+      if (res.status === 304) {
+        setTimeout(poll, 100);
+        return;
+      }
       const data = await res.json();
       if (!res.ok) throw new Error(data.detail || "Status failed");
+      etag = res.headers.get("ETag");
 
       if (data.status === "QUEUED" || data.status === "RUNNING") {
-        setStatus(`${data.status}…`);
-        setTimeout(poll, 2000);
+        setStatus(`${data.status}…${progressText(data.progress)}${etaText(data.eta_seconds)}${portalText(data.portal)}`);
+        setTimeout(poll, 500);
         return;
       }
-      if (data.status === "FAILED") {
+      if (data.status === "FAILED" && !data.download_token) {
         setStatus(`FAILED: ${data.error || "Unknown error"}`, "err");
         return;
       }
-      if (data.status === "COMPLETED") {
-        setStatus("COMPLETED. Download outputs below.", "ok");
+      if (data.status === "COMPLETED" || data.status === "FAILED") {
+        if (data.status === "FAILED") {
+          setStatus(`FAILED: ${data.error || "Unknown error"}. Rows not completed can be downloaded below.`, "err");
+        } else {
+          setStatus("COMPLETED. Download outputs below.", "ok");
+        }
         const token = data.download_token;
 
         const d1 = document.getElementById("d1");
         const d2 = document.getElementById("d2");
         d1.href = `/download/${token}/excel1?app_username=${encodeURIComponent(appU)}&app_password=${encodeURIComponent(appP)}`;
         d2.href = `/download/${token}/excel2?app_username=${encodeURIComponent(appU)}&app_password=${encodeURIComponent(appP)}`;
+        document.getElementById("d1csv").href = `${d1.href}&format=csv`;
+        document.getElementById("d2csv").href = `${d2.href}&format=csv`;
+
+        const vd = document.getElementById("vesselDownloads");
+        vd.innerHTML = "";
+        for (const v of data.vessel_outputs || []) {
+          for (const which of ["excel1", "excel2"]) {
+            const a = document.createElement("a");
+            a.className = "btnLink";
+            a.href = `/download/${token}/${which}?vessel=${encodeURIComponent(v)}&app_username=${encodeURIComponent(appU)}&app_password=${encodeURIComponent(appP)}`;
+            a.textContent = `${v}: ${which === "excel1" ? "Excel-1" : "Excel-2"} failed rows`;
+            vd.appendChild(a);
+          }
+        }
 
         document.getElementById("downloads").classList.remove("hidden");
         return;
@@ -0,0 +1,104 @@
+"""
+Job status documents cached in Redis for the polling UI.
+
+Whoever changes a job row that the status endpoint shows (the worker: state,
+progress, memory) calls refresh() afterwards. The endpoint reads the cached
+document and only goes to SQLite when it is missing. Every document carries
+a version that changes with each refresh; ETags and long-polling in
+app.main are built on it.
+"""
+import json
+
+from redis.exceptions import WatchError
+
+from app.db import get_job, has_ned_results, ned_result_vessels, merge_alias
+
+DOC_KEY = "pob:status:{}"
+VERSION_KEY = "pob:status:version:{}"
+# A document not refreshed for this long is rebuilt from SQLite on the next read
+CACHE_SECONDS = 3600
+
+
+def _build(job_id: str):
+    """Status document for one job row (not resolved through its source)."""
+    job = get_job(job_id)
+    if not job:
+        return None
+    job["has_results"] = has_ned_results(job_id)
+    job["result_vessels"] = ned_result_vessels(job_id) if job["has_results"] else []
+    return job
+
+
+def _store(conn, job_id: str, doc: dict):
+    doc["version"] = conn.incr(VERSION_KEY.format(job_id))
+    conn.expire(VERSION_KEY.format(job_id), CACHE_SECONDS)
+    conn.set(DOC_KEY.format(job_id), json.dumps(doc), ex=CACHE_SECONDS)
+
+
+def _store_if_missing(conn, job_id: str, doc: dict) -> bool:
+    """
+    Store doc unless a document is cached; False (version untouched) when a
+    worker stored one meanwhile.
+    """
+    doc_key, version_key = DOC_KEY.format(job_id), VERSION_KEY.format(job_id)
+    with conn.pipeline() as pipe:
+        try:
+            pipe.watch(doc_key, version_key)
+            if pipe.exists(doc_key):
+                return False
+            version = int(pipe.get(version_key) or 0) + 1
+            pipe.multi()
+            pipe.set(version_key, version, ex=CACHE_SECONDS)
+            pipe.set(doc_key, json.dumps({**doc, "version": version}), ex=CACHE_SECONDS)
+            pipe.execute()
+        except WatchError:
+            return False
+    doc["version"] = version
+    return True
+
+
+def refresh(conn, job_id: str):
+    """Re-read a job row after a change; pollers see the new version."""
+    try:
+        doc = _build(job_id)
+        if doc is None:
+            forget(conn, job_id)
+        else:
+            _store(conn, job_id, doc)
+    except Exception as e:
+        # Pollers keep the last document until it expires; not worth failing a job over
+        print(f"⚠ Could not refresh status cache for {job_id}: {e}")
+
+
+def forget(conn, job_id: str):
+    conn.delete(DOC_KEY.format(job_id), VERSION_KEY.format(job_id))
+
+
+def _load_one(conn, job_id: str):
+    for _ in range(3):
+        raw = conn.get(DOC_KEY.format(job_id))
+        if raw:
+            return json.loads(raw)
+        doc = _build(job_id)
+        # Never overwrite a newer document a worker stored meanwhile; read that one
+        if doc is None or _store_if_missing(conn, job_id, doc):
+            return doc
+    # Stored and gone again three times: keep this (fresh) read
+    _store(conn, job_id, doc)
+    return doc
+
+
+def load(conn, job_id: str):
+    """
+    Status document as resolve_job() would return it: an alias shows its
+    source's state. "version" combines both documents' versions.
+    """
+    job = _load_one(conn, job_id)
+    if not job or not job.get("source_job_id"):
+        return job
+    source = _load_one(conn, job["source_job_id"])
+    if not source:
+        return job
+    merged = merge_alias(job, source)
+    merged["version"] = f"{job['version']}.{source['version']}"
+    return merged
@@ -1,3 +1,8 @@
+import re, time
+
+from app.db import list_vessels
+
+# Seed list, used until the first sync from the portal's location dropdown
 VESSELS = [
   "SAMUDRA SARVEKSHAK",
   "Sea Jaguar",
@@ -106,3 +111,70 @@ VESSELS = [
   "SEA Venture",
   "MARIA1",
 ]
+
+
+CATALOG_RELOAD_SECONDS = 60
+
+_ROMAN = {"I": "1", "II": "2", "III": "3", "IV": "4", "V": "5",
+          "VI": "6", "VII": "7", "VIII": "8", "IX": "9", "X": "10"}
+
+
+def normalize_vessel_name(name) -> str:
+    """Case, punctuation and whitespace insensitive key: "Seamec-III " -> "SEAMEC III"."""
+    return " ".join(re.sub(r"[^0-9A-Z]+", " ", str(name or "").upper()).split())
+
+
+def _alias_key(norm: str) -> str:
+    # "DRA I" and "DRA 1" share an alias key
+    return " ".join(_ROMAN.get(tok, tok) for tok in norm.split())
+
+
+class VesselCatalog:
+    """
+    Vessel names (and, once synced, their portal option values) with O(1)
+    lookup by normalized name. Roman/arabic numeral aliases only resolve
+    when they are unambiguous, so "DRA I" and "DRA 1" stay distinct if the
+    portal really has both.
+    """
+
+    def __init__(self, entries: list[dict], synced_at=None):
+        self.entries = entries
+        self.synced_at = synced_at
+        self.by_norm = {}
+        aliases = {}
+        for e in entries:
+            norm = normalize_vessel_name(e["name"])
+            self.by_norm.setdefault(norm, e)
+            aliases.setdefault(_alias_key(norm), []).append(e)
+        self.by_alias = {k: v[0] for k, v in aliases.items() if len(v) == 1}
+
+    def resolve(self, name):
+        """Catalog entry {"name", "value"} for a user-supplied name, or None."""
+        norm = normalize_vessel_name(name)
+        if not norm:
+            return None
+        return self.by_norm.get(norm) or self.by_alias.get(_alias_key(norm))
+
+    def names(self) -> list[str]:
+        return [e["name"] for e in self.entries]
+
+
+_catalog = None
+_catalog_loaded_at = 0.0
+
+
+def get_catalog(force: bool = False) -> VesselCatalog:
+    """Synced catalog from the DB (reloaded at most once a minute), else the seed list."""
+    global _catalog, _catalog_loaded_at
+    now = time.time()
+    if force or _catalog is None or now - _catalog_loaded_at > CATALOG_RELOAD_SECONDS:
+        rows = list_vessels()
+        if rows:
+            _catalog = VesselCatalog(
+                [{"name": r["name"], "value": r["value"]} for r in rows],
+                synced_at=max(r["synced_at"] for r in rows),
+            )
+        else:
+            _catalog = VesselCatalog([{"name": v, "value": None} for v in VESSELS])
+        _catalog_loaded_at = now
+    return _catalog
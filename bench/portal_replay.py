@@ -0,0 +1,687 @@
+"""
+Record a real portal session once, then replay it offline to time worker.automation.
+
+    python -m bench.portal_replay record rec/mahi --vessel MAHI --off off.xlsx --on on.xlsx
+    python -m bench.portal_replay replay rec/mahi --repeat 3
+    python -m bench.portal_replay selectors rec/mahi
+
+record     runs the real automation (POB_* credentials from the environment)
+           with Playwright HAR capture and a DOM snapshot after every step
+           and NED. Before anything lands in the recording folder the
+           credentials, the NEDs, every other cell of the two sheets and
+           every table cell text the portal sent (in pages, snapshots and
+           Livewire HTML, so other crew listed in a search too) are swapped
+           for placeholders, wherever they occur; so are e-mail addresses,
+           --scrub strings and, in pages and requests, NED-like digit runs.
+           Cookies and auth headers are blanked. If a table cell still
+           looks personal afterwards, nothing is written.
+replay     runs the current automation code against the recording. Every
+           request is answered from the HAR after its recorded server time;
+           nothing reaches the network. Prints time per step next to the
+           recorded run, NED search times, and the requests the recording
+           could not answer exactly: a changed selector or wait that makes
+           the automation talk to the portal differently shows up there.
+           (Recorded step times include writing the snapshots, a few ms
+           per NED.)
+selectors  counts matches of the automation's SEL_* selectors in every
+           snapshot, to check selector edits against the portal's markup.
+
+Requests are matched on method, URL and body, with the parts that change
+every session (CSRF tokens, Livewire checksums, snapshots and update ids)
+removed, in recorded order; failing that, on a URL that only differs in
+NED-like digit runs (approximate). Recorded delays apply to documents and
+XHR/fetch, one request at a time; static assets are answered at once.
+"""
+import argparse, base64, html, json, os, re, shutil, statistics, sys, tempfile, time, urllib.parse
+
+USER_PLACEHOLDER = "pob-user"
+PASSWORD_PLACEHOLDER = "pob-password"
+EMAIL_PLACEHOLDER = "user@example.invalid"
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Standalone digit runs this long are taken for NEDs (or other personal numbers)
+MIN_NED_DIGITS = 5
+NED_LIKE_RE = re.compile(rf"(?<![\w.])\d{{{MIN_NED_DIGITS},}}(?![\w.])")
+PLACEHOLDER_RE = re.compile(r"\b(?:NED|PII)\d{5}\b")
+
+SECRET_HEADERS = {"cookie", "set-cookie", "authorization", "x-csrf-token", "x-xsrf-token"}
+# Per-session request parts, ignored when matching a request to the recording
+VOLATILE_KEYS = {"_token", "fingerprint", "serverMemo", "snapshot", "memo", "checksum", "htmlHash", "id"}
+# Answered after the recorded server time; everything else immediately
+DELAYED_TYPES = {"document", "xhr", "fetch"}
+# The replayed body is sent decoded and without cookies
+DROP_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+# Responses whose table cells and digit runs are scrubbed (pages, Livewire updates)
+MARKUP_TYPES = ("html", "json")
+# A table body cell: up to its end tag, or the next cell or row for unclosed ones
+CELL_RE = re.compile(r"(<td\b[^>]*>)(.*?)(?=</td\s*>|<td\b|</tr\s*>|</table\s*>)", re.S | re.I)
+TAG_RE = re.compile(r"(<[^>]*>)")
+# Cell parts that are controls or code, not data
+SKIP_CELL_TAGS = {"button", "select", "option", "textarea", "script", "style"}
+# Values shorter than this are not replaced across the recording (flags, counts,
+# ...); table cells have theirs replaced in place whatever the length
+MIN_SCRUB_LENGTH = 3
+REPORTED_STEPS = ["login", "select_vessel", "off_duty", "on_duty", "logout"]
+
+
+# ---------------- scrubbing ----------------
+
+def _json_escape(s):
+    return json.dumps(s)[1:-1]
+
+
+def _html_escape(s):
+    # Laravel's e() writes ' as &#039;
+    return html.escape(s).replace("&#x27;", "&#039;")
+
+
+def _php_json_escape(s):
+    return _json_escape(s).replace("/", "\\/")
+
+
+# The spellings a value takes in URLs, pages and JSON payloads (Livewire HTML included)
+ENCODINGS = (str, urllib.parse.quote_plus, urllib.parse.quote, html.escape, _html_escape,
+             lambda s: html.escape(s, quote=False), _json_escape, _php_json_escape,
+             lambda s: _php_json_escape(_html_escape(s)))
+
+
+class Scrubber:
+    """
+    Replaces whole-token occurrences of known values, in the spellings a page
+    or request uses. In markup (pages, Livewire JSON, URLs, request bodies)
+    NED-like digit runs are also swapped, each for a same-length number kept
+    consistent across the recording. page() then replaces what is left of
+    personal-looking table cell text in place; cells maps cell texts to
+    their PII placeholders and grows as it does.
+    """
+
+    def __init__(self, replacements: dict, cells: dict = None, protected: tuple = ()):
+        self.cells = dict(cells or {})
+        self.protected = protected
+        variants = {}
+        for value, placeholder in replacements.items():
+            for enc in ENCODINGS:
+                variants.setdefault(enc(value), enc(placeholder))
+        self.lookup = variants
+        # Longest first, so a value is not replaced inside a longer one
+        keys = sorted(variants, key=len, reverse=True)
+        self.regex = re.compile("|".join(rf"(?<!\w){re.escape(k)}(?!\w)" for k in keys)) if keys else None
+        self.numbers = {}
+
+    def _number(self, m):
+        run = m.group(0)
+        if run not in self.numbers:
+            # Same first digit and length: timestamps and timeouts keep their magnitude
+            self.numbers[run] = run[0] + f"{len(self.numbers) + 1:0{len(run) - 1}d}"
+        return self.numbers[run]
+
+    def text(self, value, markup: bool = True):
+        if not value:
+            return value
+        if self.regex is not None:
+            value = self.regex.sub(lambda m: self.lookup[m.group(0)], value)
+        if markup:
+            value = NED_LIKE_RE.sub(self._number, value)
+        return EMAIL_RE.sub(EMAIL_PLACEHOLDER, value)
+
+    def _cell(self, part: str) -> str:
+        value = html.unescape(part.strip())
+        if not _personal(value, self.protected):
+            return part
+        if value not in self.cells:
+            self.cells[value] = f"PII{len(self.cells) + 1:05d}"
+        lead, trail = part[:len(part) - len(part.lstrip())], part[len(part.rstrip()):]
+        return lead + self.cells[value] + trail
+
+    def page(self, value: str, is_json: bool = False) -> str:
+        """text(), then table cell texts that still look personal are replaced."""
+        return _rewrite_markup(self.text(value), is_json, self._cell)
+
+    def entry(self, entry: dict):
+        req, res = entry["request"], entry["response"]
+        req["url"] = self.text(req["url"])
+        for part in (req, res):
+            for h in part.get("headers", []):
+                h["value"] = "REDACTED" if h["name"].lower() in SECRET_HEADERS else self.text(h["value"], False)
+            part["cookies"] = []
+        for q in req.get("queryString", []):
+            q["value"] = self.text(q["value"])
+        post = req.get("postData")
+        if post:
+            post["text"] = self.text(post.get("text"))
+            for p in post.get("params", []):
+                p["value"] = self.text(p.get("value"))
+        content = res.get("content", {})
+        if content.get("text") and content.get("encoding") != "base64":
+            if _is_markup(content):
+                content["text"] = self.page(content["text"], _is_json(content))
+            else:
+                content["text"] = self.text(content["text"], markup=False)
+        res["redirectURL"] = self.text(res.get("redirectURL"))
+
+
+def _is_markup(content: dict) -> bool:
+    mime = (content.get("mimeType") or "").lower()
+    return any(t in mime for t in MARKUP_TYPES)
+
+
+def _is_json(content: dict) -> bool:
+    return "json" in (content.get("mimeType") or "").lower()
+
+
+def _rewrite_cells(page: str, fn) -> str:
+    """
+    page with fn applied to every text run inside its table body cells (raw
+    HTML, entities kept), leaving out form controls, scripts and styles.
+    """
+    def cell(m):
+        parts = TAG_RE.split(m.group(2))
+        skip = 0
+        for i, part in enumerate(parts):
+            if i % 2:
+                name = re.match(r"</?\s*([a-zA-Z0-9]+)", part)
+                if name and name.group(1).lower() in SKIP_CELL_TAGS:
+                    skip = max(0, skip + (-1 if part.startswith("</") else 1))
+            elif not skip and part.strip():
+                parts[i] = fn(part)
+        return m.group(1) + "".join(parts)
+    return CELL_RE.sub(cell, page)
+
+
+def _map_strings(value, fn):
+    if isinstance(value, str):
+        return fn(value)
+    if isinstance(value, dict):
+        return {k: _map_strings(v, fn) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_map_strings(v, fn) for v in value]
+    return value
+
+
+def _rewrite_markup(text: str, is_json: bool, fn) -> str:
+    """_rewrite_cells over a page, or over the HTML strings in a JSON payload (Livewire effects)."""
+    if not is_json:
+        return _rewrite_cells(text, fn)
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    return json.dumps(_map_strings(data, lambda s: _rewrite_cells(s, fn) if "<" in s else s))
+
+
+def cell_texts(text: str, is_json: bool = False) -> list:
+    """Table cell texts (unescaped) of a page or a JSON payload."""
+    found = []
+
+    def collect(part):
+        found.append(html.unescape(part.strip()))
+        return part
+    _rewrite_markup(text, is_json, collect)
+    return found
+
+
+def _har_markup(har: dict):
+    """(text, is_json) of every markup response body in a HAR."""
+    for entry in har["log"]["entries"]:
+        content = entry["response"].get("content", {})
+        if content.get("text") and content.get("encoding") != "base64" and _is_markup(content):
+            yield content["text"], _is_json(content)
+
+
+def _protected_words() -> tuple:
+    """UI texts the automation relies on (upper case); a cell starting with one is left alone."""
+    from worker import automation
+    words = {"ON DUTY", "OFF DUTY"}
+    for name, value in vars(automation).items():
+        if not name.startswith("SEL_") or not isinstance(value, str):
+            continue
+        if name.startswith("SEL_BULK_O"):
+            words.add(value)    # link texts, not selectors
+        elif value.startswith("text="):
+            words.add(value[len("text="):])
+        else:
+            words.update(w for pair in re.findall(r'has-text\("([^"]+)"\)|value="([^"]+)"', value)
+                         for w in pair if w)
+    return tuple(sorted(w.upper() for w in words))
+
+
+def _personal(text: str, protected: tuple) -> bool:
+    """Cell text that may identify someone: has letters besides placeholders and UI texts."""
+    if text.upper().startswith(protected):
+        return False
+    return re.search(r"[^\W\d_]", PLACEHOLDER_RE.sub("", text)) is not None
+
+
+def build_scrubber(sheets: list, ned_cols: list, keep: set, extra: list, markup: list):
+    """
+    Scrubber over the credentials, the NEDs (-> NED00001, ...), every other
+    text cell of the sheets and every table cell text the portal sent
+    (markup: (text, is_json) pairs; -> PII00001, ...). Returns the scrubber,
+    the NED mapping and the protected UI texts.
+    """
+    from app.excel_utils import read_rows_as_dicts
+    from app.preflight import normalize_ned
+    from app.settings import POB_USERNAME, POB_PASSWORD
+
+    replacements, neds, other = {}, {}, {}
+    if POB_USERNAME:
+        replacements[POB_USERNAME] = USER_PLACEHOLDER
+    if POB_PASSWORD:
+        replacements[POB_PASSWORD] = PASSWORD_PLACEHOLDER
+    protected = tuple(w.upper() for w in keep) + _protected_words()
+
+    def add(value):
+        if value not in other and value.upper() not in protected:
+            other[value] = f"PII{len(other) + 1:05d}"
+
+    for path, ned_col in zip(sheets, ned_cols):
+        _header, rows = read_rows_as_dicts(path)
+        for row in rows:
+            for col, value in row.items():
+                if col == ned_col:
+                    ned = normalize_ned(value)
+                    if len(ned) >= MIN_SCRUB_LENGTH and ned not in neds:
+                        neds[ned] = f"NED{len(neds) + 1:05d}"
+                elif isinstance(value, str) and len(value.strip()) >= MIN_SCRUB_LENGTH:
+                    add(value.strip())
+    for text, is_json in markup:
+        for cell in cell_texts(text, is_json):
+            # Shorter ones are only replaced inside cells (Scrubber.page)
+            if len(cell) >= MIN_SCRUB_LENGTH and cell not in neds and _personal(cell, protected):
+                add(cell)
+    for value in extra:
+        add(value)
+    replacements.update(other)
+    replacements.update(neds)
+    return Scrubber(replacements, cells=other, protected=protected), neds, protected
+
+
+def unscrubbed_cells(markup: list, protected: tuple) -> int:
+    """Table cells still holding personal-looking text after scrubbing."""
+    return sum(1 for text, is_json in markup for cell in cell_texts(text, is_json) if _personal(cell, protected))
+
+
+# ---------------- replay ----------------
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def normalize_body(text):
+    if not text:
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        pairs = urllib.parse.parse_qsl(text, keep_blank_values=True)
+        if not pairs:
+            return text
+        return urllib.parse.urlencode(sorted((k, v) for k, v in pairs if k not in VOLATILE_KEYS))
+    return json.dumps(_strip_volatile(data), sort_keys=True)
+
+
+class Replayer:
+    """Playwright route handler answering from a HAR, in recorded order and time."""
+
+    def __init__(self, har_path: str, speed: float = 1.0):
+        with open(har_path, encoding="utf-8") as f:
+            entries = json.load(f)["log"]["entries"]
+        self.speed = speed
+        self.requests = {}
+        self.masked = {}
+        for entry in entries:
+            if entry["response"].get("status", 0) <= 0:
+                continue    # aborted while recording
+            req = entry["request"]
+            key = (req["method"], req["url"].split("#")[0])
+            body = normalize_body((req.get("postData") or {}).get("text"))
+            item = {"entry": entry, "body": body, "used": False}
+            self.requests.setdefault(key, []).append(item)
+            self.masked.setdefault((key[0], NED_LIKE_RE.sub("#", key[1])), []).append(item)
+        self.stats = {"exact": 0, "reused": 0, "approximate": 0, "unmatched": [], "delay_seconds": 0.0}
+
+    def _match(self, method: str, url: str, body):
+        url = url.split("#")[0]
+        candidates = self.requests.get((method, url))
+        if not candidates:
+            # Digit runs were scrubbed in pages but not in scripts and styles,
+            # so a URL built by one of those may differ from the recording there
+            candidates = self.masked.get((method, NED_LIKE_RE.sub("#", url)))
+            if not candidates:
+                return None, "unmatched"
+            for c in candidates:
+                if not c["used"]:
+                    c["used"] = True
+                    return c["entry"], "approximate"
+            return candidates[-1]["entry"], "approximate"
+        body = normalize_body(body)
+        for c in candidates:
+            if not c["used"] and c["body"] == body:
+                c["used"] = True
+                return c["entry"], "exact"
+        for c in reversed(candidates):
+            if c["body"] == body:
+                return c["entry"], "reused"
+        for c in candidates:
+            if not c["used"]:
+                c["used"] = True
+                return c["entry"], "approximate"
+        return candidates[-1]["entry"], "approximate"
+
+    def handle(self, route):
+        request = route.request
+        entry, how = self._match(request.method, request.url, request.post_data)
+        if entry is None:
+            self.stats["unmatched"].append(f"{request.method} {request.url}")
+            route.fulfill(status=404, body="not in recording")
+            return
+        self.stats[how] += 1
+        if request.resource_type in DELAYED_TYPES:
+            delay = max(0.0, entry.get("time") or 0.0) / 1000 / self.speed
+            self.stats["delay_seconds"] += delay
+            time.sleep(delay)
+
+        res = entry["response"]
+        content = res.get("content", {})
+        if content.get("encoding") == "base64":
+            body = base64.b64decode(content.get("text") or "")
+        else:
+            body = (content.get("text") or "").encode("utf-8")
+        headers = {h["name"]: h["value"] for h in res.get("headers", [])
+                   if h["name"].lower() not in DROP_RESPONSE_HEADERS}
+        route.fulfill(status=res["status"], headers=headers, body=body)
+
+
+# ---------------- sessions ----------------
+
+def _session_classes():
+    from worker.automation import PortalSession
+
+    class RecordingSession(PortalSession):
+        har_dir = None
+        current = None
+
+        def _new_context(self, **options):
+            # One HAR per context; a memory recycle starts a new one
+            path = os.path.join(self.har_dir, f"{len(os.listdir(self.har_dir)):02d}.har")
+            return super()._new_context(record_har_path=path, record_har_content="embed", **options)
+
+        def __enter__(self):
+            RecordingSession.current = self
+            return super().__enter__()
+
+    class ReplaySession(PortalSession):
+        replayer = None
+
+        def _new_context(self, **options):
+            context = super()._new_context(service_workers="block", **options)
+            context.route("**/*", self.replayer.handle)
+            return context
+
+    return RecordingSession, ReplaySession
+
+
+def _spec(job_id: str, vessel: str, off: list, on: list) -> dict:
+    from app.preflight import run_preflight
+    return {
+        "job_id": job_id,
+        "preflight": run_preflight(off, on),
+        "neds1": list(off),
+        "vessels1": [vessel] * len(off),
+        "neds2": list(on),
+        "vessels2": [vessel] * len(on),
+    }
+
+
+def _scratch_data_dir() -> str:
+    """Fresh DATA_DIR (empty vessel catalog, like a new deployment) for this process."""
+    work = tempfile.mkdtemp(prefix="pob-replay-")
+    os.environ["DATA_DIR"] = os.path.join(work, "data")
+    from app.db import init_db
+    init_db()
+    return work
+
+
+def _merge_hars(har_dir: str) -> dict:
+    merged = None
+    for name in sorted(os.listdir(har_dir)):
+        with open(os.path.join(har_dir, name), encoding="utf-8") as f:
+            har = json.load(f)
+        if merged is None:
+            merged = har
+        else:
+            merged["log"]["entries"].extend(har["log"]["entries"])
+    merged["log"]["entries"].sort(key=lambda e: e["startedDateTime"])
+    return merged
+
+
+def record(args):
+    work = _scratch_data_dir()
+    from app.excel_utils import read_columns
+    from app.preflight import normalize_ned
+    from app.settings import POB_URL, POB_LOCATION_URL
+    from worker.automation import run_coalesced_automation
+
+    RecordingSession, _ = _session_classes()
+    raw_har_dir = os.path.join(work, "har")
+    raw_snap_dir = os.path.join(work, "snapshots")
+    os.makedirs(raw_har_dir)
+    os.makedirs(raw_snap_dir)
+    RecordingSession.har_dir = raw_har_dir
+
+    def ned_list(path, col):
+        _header, columns = read_columns(path, [col])
+        if col not in columns:
+            sys.exit(f"Column not found in {path}: {col}")
+        return [normalize_ned(v) for v in columns[col]]
+
+    off, on = ned_list(args.off, args.col1), ned_list(args.on, args.col2)
+    snapshots = []
+
+    def snapshot(label):
+        session = RecordingSession.current
+        if session is None or session.page is None:
+            return
+        try:
+            path = os.path.join(raw_snap_dir, f"{len(snapshots):04d}-{label}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(session.page.content())
+            snapshots.append(path)
+        except Exception as e:
+            print(f"⚠ Snapshot {label} failed: {e}")
+
+    steps, results, done = [], [], [0]
+
+    def on_step(timing):
+        steps.append(timing)
+        snapshot(timing["step"])
+
+    def on_progress(_job_id, _progress):
+        done[0] += 1
+        snapshot(f"ned{done[0]:04d}")
+
+    try:
+        started = time.perf_counter()
+        run_coalesced_automation([_spec("record", args.vessel, off, on)], on_progress=on_progress,
+                                 on_results=results.extend, on_step=on_step, session_class=RecordingSession)
+        total = time.perf_counter() - started
+
+        har = _merge_hars(raw_har_dir)
+        pages = {}
+        for path in snapshots:
+            with open(path, encoding="utf-8") as f:
+                pages[os.path.basename(path)] = f.read()
+        raw_markup = list(_har_markup(har)) + [(text, False) for text in pages.values()]
+        scrub, neds, protected = build_scrubber([args.off, args.on], [args.col1, args.col2],
+                                                keep={args.vessel}, extra=args.scrub or [], markup=raw_markup)
+        for entry in har["log"]["entries"]:
+            scrub.entry(entry)
+        pages = {name: scrub.page(text) for name, text in pages.items()}
+        left = unscrubbed_cells(list(_har_markup(har)) + [(text, False) for text in pages.values()], protected)
+        if left:
+            sys.exit(f"{left} table cell(s) still hold personal-looking text after scrubbing; "
+                     "nothing was written")
+
+        os.makedirs(os.path.join(args.dir, "snapshots"), exist_ok=True)
+        with open(os.path.join(args.dir, "session.har"), "w", encoding="utf-8") as f:
+            json.dump(har, f)
+        for name, text in pages.items():
+            with open(os.path.join(args.dir, "snapshots", name), "w", encoding="utf-8") as f:
+                f.write(text)
+        session = {
+            "recorded_at": time.time(),
+            "vessel": args.vessel,
+            "portal_url": POB_URL,
+            "location_url": POB_LOCATION_URL,
+            "off": [neds.get(n, n) for n in off],
+            "on": [neds.get(n, n) for n in on],
+            "total_seconds": round(total, 2),
+            "steps": [{k: t[k] for k in ("step", "vessel", "items", "seconds")} for t in steps],
+            "neds": [{"list": r["list"], "ned": neds.get(r["ned"], r["ned"]), "status": r["status"],
+                      "reason": scrub.text(r["reason"]), "elapsed_ms": r["elapsed_ms"]} for r in results],
+            "requests": len(har["log"]["entries"]),
+        }
+        with open(os.path.join(args.dir, "session.json"), "w", encoding="utf-8") as f:
+            json.dump(session, f, indent=1)
+        print(f"Recorded {session['requests']} requests and {len(snapshots)} snapshots in {args.dir} "
+              f"({total:.1f}s)")
+    finally:
+        # The raw HAR holds credentials and personal data; only the scrubbed copy is kept
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def _step_seconds(steps: list) -> dict:
+    out = {}
+    for t in steps:
+        out[t["step"]] = out.get(t["step"], 0.0) + t["seconds"]
+    return out
+
+
+def replay(args):
+    with open(os.path.join(args.dir, "session.json"), encoding="utf-8") as f:
+        session = json.load(f)
+    os.environ["HEADLESS"] = "false" if args.headed else "true"
+    work = _scratch_data_dir()
+    from app.db import replace_vessels
+    from app.vessels import get_catalog
+    from worker import automation
+
+    _, ReplaySession = _session_classes()
+    # The recording was scrubbed; log in with the placeholders it contains
+    automation.POB_USERNAME, automation.POB_PASSWORD = USER_PLACEHOLDER, PASSWORD_PLACEHOLDER
+    automation.POB_URL, automation.POB_LOCATION_URL = session["portal_url"], session["location_url"]
+
+    runs = []
+    try:
+        for _ in range(args.repeat):
+            # Same starting point each run: empty catalog, synced at login as when recorded
+            replace_vessels([])
+            get_catalog(force=True)
+            ReplaySession.replayer = Replayer(os.path.join(args.dir, "session.har"), args.speed)
+            steps, results = [], []
+            started = time.perf_counter()
+            automation.run_coalesced_automation(
+                [_spec("replay", session["vessel"], session["off"], session["on"])],
+                on_results=results.extend, on_step=steps.append, session_class=ReplaySession)
+            runs.append({
+                "total_seconds": time.perf_counter() - started,
+                "steps": _step_seconds(steps),
+                "search_ms": [r["elapsed_ms"] for r in results if r["elapsed_ms"] is not None],
+                "failed": sum(1 for r in results if r["status"] != "ok"),
+                "requests": ReplaySession.replayer.stats,
+            })
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    recorded = _step_seconds(session["steps"])
+    recorded_search = [n["elapsed_ms"] for n in session["neds"] if n["elapsed_ms"] is not None]
+    report = {
+        "recorded": {"total_seconds": session["total_seconds"], "steps": recorded,
+                     "failed": sum(1 for n in session["neds"] if n["status"] != "ok")},
+        "runs": runs,
+    }
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return
+
+    def median_ms(values):
+        return f"{statistics.median(values) / 1000:.2f}" if values else "-"
+
+    def cell(value, width):
+        return f" {value:>{width}.2f}" if value is not None else f" {'-':>{width}}"
+
+    print(f"\n{'step':<16} {'recorded s':>11}" + "".join(f" {'run ' + str(i + 1):>9}" for i in range(len(runs))))
+    for step in REPORTED_STEPS:
+        print(f"{step:<16}" + cell(recorded.get(step), 11) + "".join(cell(r["steps"].get(step), 9) for r in runs))
+    print(f"{'total':<16}" + cell(session["total_seconds"], 11) + "".join(cell(r["total_seconds"], 9) for r in runs))
+    print(f"{'search median':<16} {median_ms(recorded_search):>11}"
+          + "".join(f" {median_ms(r['search_ms']):>9}" for r in runs))
+    print(f"{'failed NEDs':<16} {report['recorded']['failed']:>11}" + "".join(f" {r['failed']:>9}" for r in runs))
+    for i, r in enumerate(runs):
+        s = r["requests"]
+        print(f"run {i + 1}: {s['exact']} exact, {s['reused']} repeated, {s['approximate']} approximate, "
+              f"{len(s['unmatched'])} unmatched requests; {s['delay_seconds']:.1f}s recorded server time")
+        for line in s["unmatched"][:10]:
+            print(f"    not in recording: {line}")
+
+
+def selectors(args):
+    from playwright.sync_api import sync_playwright
+    from worker import automation
+
+    names = sorted(k for k, v in vars(automation).items() if k.startswith("SEL_") and isinstance(v, str))
+    snap_dir = os.path.join(args.dir, "snapshots")
+    files = sorted(os.listdir(snap_dir))
+    print(f"{'snapshot':<28}" + "".join(f" {n[4:][:14]:>14}" for n in names))
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.route("**/*", lambda route: route.abort())    # markup only, nothing loaded
+        for name in files:
+            with open(os.path.join(snap_dir, name), encoding="utf-8") as f:
+                page.set_content(f.read(), wait_until="domcontentloaded")
+            counts = []
+            for sel in names:
+                value = getattr(automation, sel)
+                try:
+                    # Bulk action labels are link texts, not selectors
+                    loc = page.get_by_text(value) if sel.startswith("SEL_BULK_O") else page.locator(value)
+                    counts.append(loc.count())
+                except Exception:
+                    counts.append("err")
+            print(f"{name[:28]:<28}" + "".join(f" {c:>14}" for c in counts))
+        browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="run against the live portal and save a scrubbed recording")
+    rec.add_argument("dir", help="recording folder")
+    rec.add_argument("--vessel", required=True)
+    rec.add_argument("--off", required=True, help="Excel 1 (OFF DUTY) sheet")
+    rec.add_argument("--on", required=True, help="Excel 2 (ON DUTY) sheet")
+    rec.add_argument("--col1", default="NED", help="NED column of --off")
+    rec.add_argument("--col2", default="NED", help="NED column of --on")
+    rec.add_argument("--scrub", action="append", help="extra text to scrub (repeatable)")
+
+    rep = sub.add_parser("replay", help="run the automation against a recording")
+    rep.add_argument("dir", help="recording folder")
+    rep.add_argument("--repeat", type=int, default=1)
+    rep.add_argument("--speed", type=float, default=1.0, help="divide recorded server times by this")
+    rep.add_argument("--headed", action="store_true")
+    rep.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    sel = sub.add_parser("selectors", help="count selector matches in the recorded snapshots")
+    sel.add_argument("dir", help="recording folder")
+
+    args = parser.parse_args()
+    {"record": record, "replay": replay, "selectors": selectors}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
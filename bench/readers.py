@@ -0,0 +1,104 @@
+"""
+Parse time and peak memory of the sheet readers (app.sheet_readers).
+
+    python -m bench.readers                      # 1k, 10k, 50k, 200k rows
+    python -m bench.readers --sizes 1000 5000 --repeat 3
+
+Generates manifest-like sheets (NED, name, designation, vessel, date and a
+few filler columns) as xlsx and csv in a temp folder, then times each
+reader on the NED + vessel columns the way a job reads them, plus header
+extraction and a cache hit through app.excel_utils. Peak memory is the
+tracemalloc peak (Python allocations) of a separate traced run.
+"""
+import argparse, csv, datetime, os, shutil, sys, tempfile, time, tracemalloc
+
+from openpyxl import Workbook
+
+HEADER = ["NED", "Name", "Designation", "Vessel", "Joined", "Company", "Remarks", "Contact"]
+COLUMNS = ["NED", "Vessel"]
+
+
+def make_rows(n: int):
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(n):
+        yield [100000 + i, f"Person {i}", "Technician", f"VESSEL {i % 7}",
+               start + datetime.timedelta(days=i % 365), "Contractor Ltd", "", f"98{i:08d}"]
+
+
+def write_xlsx(path: str, n: int):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(HEADER)
+    for row in make_rows(n):
+        ws.append(row)
+    wb.save(path)
+
+
+def write_csv(path: str, n: int):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        for row in make_rows(n):
+            w.writerow([v.date().isoformat() if isinstance(v, datetime.datetime) else v for v in row])
+
+
+def measure(fn, repeat: int):
+    # Timed runs without tracemalloc (it slows allocation-heavy parsers a lot),
+    # then one traced run for the peak.
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 200000])
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is reported")
+    parser.add_argument("--keep", action="store_true", help="keep the generated files")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="pob-bench-")
+    # Keep the parse cache inside the scratch folder
+    os.environ["DATA_DIR"] = os.path.join(work, "data")
+    from app.sheet_readers import OpenpyxlReader, XlsxXmlReader, CsvReader
+    from app import excel_utils
+
+    print(f"{'rows':>8}  {'case':<28} {'seconds':>9} {'peak MB':>9}")
+    try:
+        for n in args.sizes:
+            xlsx, csv_path = os.path.join(work, f"m{n}.xlsx"), os.path.join(work, f"m{n}.csv")
+            write_xlsx(xlsx, n)
+            write_csv(csv_path, n)
+            cases = [
+                ("openpyxl headers", lambda: OpenpyxlReader().headers(xlsx)),
+                ("xlsx-xml headers", lambda: XlsxXmlReader().headers(xlsx)),
+                ("openpyxl columns", lambda: OpenpyxlReader().columns(xlsx, COLUMNS)),
+                ("xlsx-xml columns", lambda: XlsxXmlReader().columns(xlsx, COLUMNS)),
+                ("csv columns", lambda: CsvReader().columns(csv_path, COLUMNS)),
+                ("openpyxl full rows", lambda: OpenpyxlReader().rows(xlsx)),
+                ("csv full rows", lambda: CsvReader().rows(csv_path)),
+            ]
+            excel_utils.read_columns(xlsx, COLUMNS)    # warm the cache for the next case
+            cases.append(("cached columns (xlsx)", lambda: excel_utils.read_columns(xlsx, COLUMNS)))
+
+            for name, fn in cases:
+                seconds, peak = measure(fn, args.repeat)
+                print(f"{n:>8}  {name:<28} {seconds:>9.3f} {peak / 1e6:>9.1f}")
+            sys.stdout.flush()
+    finally:
+        if args.keep:
+            print(f"files kept in {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,13 @@
 #!/bin/bash
-# Start the RQ worker in the background
-python3 worker.py &
-# Start the FastAPI web server in the foreground
-python3 -m uvicorn app.main:app --host 0.0.0.0 --port $PORT
+# Start the worker supervisor (runs WORKER_CONCURRENCY RQ workers) in the background
+python3 supervisor.py &
+SUPERVISOR_PID=$!
+# Start the FastAPI web server
+python3 -m uvicorn app.main:app --host 0.0.0.0 --port $PORT &
+WEB_PID=$!
+
+# Forward container stop signals so workers get a graceful shutdown
+trap 'kill -TERM $SUPERVISOR_PID $WEB_PID 2>/dev/null' TERM INT
+wait $WEB_PID
+kill -TERM $SUPERVISOR_PID 2>/dev/null
+wait $SUPERVISOR_PID
@@ -0,0 +1,174 @@
+import json, signal, socket, subprocess, sys, time
+
+from rq import Worker
+
+from app.settings import (
+    WORKER_CONCURRENCY, WORKER_MAX_CONCURRENCY, WORKER_MEMORY_MB,
+    WEB_RESERVED_MEMORY_MB, WORKER_SHUTDOWN_GRACE_SECONDS
+)
+from app.redis_conn import get_redis
+
+HEALTH_KEY_PREFIX = "pob:supervisor:"
+HEALTH_TTL_SECONDS = 60
+CHECK_EVERY_SECONDS = 5
+MAX_RESTART_BACKOFF_SECONDS = 60
+
+
+def available_memory_mb() -> int:
+    """Container memory limit (cgroup v2/v1), falling back to host MemTotal."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                raw = f.read().strip()
+            if raw != "max" and int(raw) < (1 << 60):
+                return int(raw) // (1024 * 1024)
+        except Exception:
+            pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) // 1024
+    except Exception:
+        pass
+    return WORKER_MEMORY_MB + WEB_RESERVED_MEMORY_MB
+
+
+def resolve_concurrency() -> int:
+    if WORKER_CONCURRENCY > 0:
+        return WORKER_CONCURRENCY
+    usable = available_memory_mb() - WEB_RESERVED_MEMORY_MB
+    return max(1, min(WORKER_MAX_CONCURRENCY, usable // WORKER_MEMORY_MB))
+
+
+class WorkerSlot:
+    def __init__(self, index: int):
+        self.index = index
+        self.proc = None
+        self.started_at = None
+        self.restarts = 0
+        self.last_exit_code = None
+        self.next_start_at = 0.0
+        self.backoff = 1
+
+    def start(self):
+        self.proc = subprocess.Popen([sys.executable, "worker.py", str(self.index)])
+        self.started_at = time.time()
+        print(f"[supervisor] started worker {self.index} (pid {self.proc.pid})")
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def reap(self):
+        """Record a crashed worker and schedule its restart with backoff."""
+        self.last_exit_code = self.proc.returncode
+        # A worker that ran for a while gets restarted right away; one that keeps
+        # dying on startup backs off so we don't spin on a broken environment.
+        if time.time() - self.started_at > 60:
+            self.backoff = 1
+        else:
+            self.backoff = min(self.backoff * 2, MAX_RESTART_BACKOFF_SECONDS)
+        self.next_start_at = time.time() + self.backoff
+        self.restarts += 1
+        print(f"[supervisor] worker {self.index} exited with {self.last_exit_code}, "
+              f"restarting in {self.backoff}s")
+        self.proc = None
+
+
+class Supervisor:
+    def __init__(self, concurrency: int):
+        self.slots = [WorkerSlot(i) for i in range(concurrency)]
+        self.stopping = False
+        self.redis = get_redis()
+        self.health_key = HEALTH_KEY_PREFIX + socket.gethostname()
+
+    def request_stop(self, signum, frame):
+        if self.stopping:
+            return
+        print(f"[supervisor] received signal {signum}, shutting down workers")
+        self.stopping = True
+
+    def rq_state(self, slot: WorkerSlot) -> dict:
+        # The rq worker registers itself under the name built in worker.py
+        if not slot.alive():
+            return {}
+        name = f"{socket.gethostname()}-w{slot.index}-{slot.proc.pid}"
+        try:
+            w = Worker.find_by_key(Worker.redis_worker_namespace_prefix + name, connection=self.redis)
+            if not w:
+                return {"state": "starting"}
+            return {
+                "state": w.get_state(),
+                "current_job_id": w.get_current_job_id(),
+                "last_heartbeat": w.last_heartbeat.timestamp() if w.last_heartbeat else None,
+            }
+        except Exception as e:
+            return {"state": "unknown", "error": str(e)}
+
+    def report_health(self):
+        workers = []
+        for slot in self.slots:
+            item = {
+                "index": slot.index,
+                "pid": slot.proc.pid if slot.alive() else None,
+                "alive": slot.alive(),
+                "started_at": slot.started_at,
+                "restarts": slot.restarts,
+                "last_exit_code": slot.last_exit_code,
+            }
+            item.update(self.rq_state(slot))
+            workers.append(item)
+        health = {
+            "host": socket.gethostname(),
+            "concurrency": len(self.slots),
+            "updated_at": time.time(),
+            "workers": workers,
+        }
+        try:
+            self.redis.set(self.health_key, json.dumps(health), ex=HEALTH_TTL_SECONDS)
+        except Exception as e:
+            print(f"[supervisor] could not publish health: {e}")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        print(f"[supervisor] running {len(self.slots)} worker(s)")
+
+        while not self.stopping:
+            now = time.time()
+            for slot in self.slots:
+                if slot.proc is not None and not slot.alive():
+                    slot.reap()
+                if slot.proc is None and now >= slot.next_start_at:
+                    slot.start()
+            self.report_health()
+            time.sleep(CHECK_EVERY_SECONDS)
+
+        self.shutdown()
+
+    def shutdown(self):
+        # SIGTERM asks rq for a warm shutdown: the current job is allowed to finish
+        for slot in self.slots:
+            if slot.alive():
+                slot.proc.send_signal(signal.SIGTERM)
+
+        deadline = time.time() + WORKER_SHUTDOWN_GRACE_SECONDS
+        for slot in self.slots:
+            if slot.proc is None:
+                continue
+            try:
+                slot.proc.wait(timeout=max(0, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                print(f"[supervisor] worker {slot.index} did not stop in time, killing")
+                slot.proc.kill()
+                slot.proc.wait()
+
+        try:
+            self.redis.delete(self.health_key)
+        except Exception:
+            pass
+        print("[supervisor] all workers stopped")
+
+
+if __name__ == "__main__":
+    Supervisor(resolve_concurrency()).run()
@@ -0,0 +1,57 @@
+"""
+Job duration predictions and RQ timeouts from step history (app.estimates).
+"""
+import pytest
+
+from app import estimates
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """{(step, vessel or None): [(seconds, items), ...]} served as recent_step_timings."""
+    rows = {}
+
+    def recent_step_timings(step, vessel=None, limit=30):
+        return [{"seconds": s, "items": n} for s, n in rows.get((step, vessel), [])][:limit]
+
+    monkeypatch.setattr(estimates, "recent_step_timings", recent_step_timings)
+    monkeypatch.setattr(estimates, "_rates", {})
+    return rows
+
+
+def test_defaults_without_history(history):
+    d = estimates.DEFAULT_STEP_SECONDS
+    expected = d["login"] + d["logout"] + d["select_vessel"] + 4 * d["off_duty"] + 2 * d["on_duty"]
+    assert estimates.predict_seconds({"MAHI": (4, 2)}) == expected
+
+
+def test_nothing_to_search_predicts_zero(history):
+    assert estimates.predict_seconds({"MAHI": (0, 0)}) == 0.0
+    assert estimates.predict_seconds({}) == 0.0
+
+
+def test_vessel_history_needs_enough_samples(history):
+    history[("off_duty", None)] = [(20, 2)] * estimates.MIN_SAMPLES          # 10 s per NED
+    history[("off_duty", "MAHI")] = [(60, 2)] * (estimates.MIN_SAMPLES - 1)  # too few
+    history[("off_duty", "URJA")] = [(12, 3), (15, 3), (30, 3)]               # median 5 s
+    assert estimates.step_seconds("off_duty", "MAHI") == 10
+    assert estimates.step_seconds("off_duty", "URJA") == 5
+
+
+def test_job_timeout_is_clamped(monkeypatch):
+    monkeypatch.setattr(estimates, "JOB_TIMEOUT_FACTOR", 1.5)
+    monkeypatch.setattr(estimates, "JOB_TIMEOUT_MARGIN_SECONDS", 300)
+    monkeypatch.setattr(estimates, "JOB_TIMEOUT_MIN_SECONDS", 600)
+    monkeypatch.setattr(estimates, "JOB_TIMEOUT_MAX_SECONDS", 3600)
+    assert estimates.job_timeout(0) == 600
+    assert estimates.job_timeout(1000) == 1800
+    assert estimates.job_timeout(10_000) == 3600
+
+
+def test_remaining_seconds_follows_progress():
+    job = {"predicted_seconds": 100.0, "started_at": 1000.0,
+           "progress": {"MAHI": {"off": {"done": 3, "total": 4}, "on": {"done": 0, "total": 4}}}}
+    assert estimates.remaining_seconds(job, now=1010.0) == 62.5
+    job["progress"] = {}
+    assert estimates.remaining_seconds(job, now=1030.0) == 70.0
+    assert estimates.remaining_seconds(job, now=1200.0) == 0.0
@@ -0,0 +1,85 @@
+"""
+Dispatch order of app.job_scheduler: shortest predicted run first, aged by
+queue time, with vessels of waiting jobs held back from lower-ranked ones.
+"""
+import pytest
+
+from app import job_scheduler
+
+fakeredis = pytest.importorskip("fakeredis")
+
+T0 = 1_700_000_000.0
+
+
+class RecordingQueue:
+    """Stands in for the RQ queue; remembers what was enqueued."""
+
+    def __init__(self):
+        self.started = []
+
+    def enqueue(self, task, job_id, job_timeout=None):
+        self.started.append(job_id)
+
+
+@pytest.fixture
+def conn():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def queue():
+    return RecordingQueue()
+
+
+def submit(conn, queue, job_id, vessels, predicted, queued_at):
+    job_scheduler.submit(conn, queue, job_id, "acct", vessels, rows=10, timeout=600,
+                         predicted=predicted, queued_at=queued_at)
+
+
+def finish(conn, queue, job_id):
+    job_scheduler.release(conn, job_id)
+    return job_scheduler.dispatch(conn, queue)
+
+
+def test_shortest_first(conn, queue, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "PORTAL_MAX_SESSIONS", 1)
+    submit(conn, queue, "running", ["A"], 50, T0)
+    submit(conn, queue, "big", ["B"], 1000, T0 + 1)
+    submit(conn, queue, "small", ["C"], 10, T0 + 2)
+    assert queue.started == ["running"]
+    assert job_scheduler.position(conn, "small") == 0
+
+    assert finish(conn, queue, "running") == ["small"]
+    assert finish(conn, queue, "small") == ["big"]
+
+
+def test_waiting_time_ages_large_jobs(conn, queue, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "PORTAL_MAX_SESSIONS", 1)
+    submit(conn, queue, "running", ["A"], 50, T0)
+    submit(conn, queue, "big", ["B"], 1000, T0)
+    # Queued later than the size difference (990s at AGING_WEIGHT 1): too late to overtake
+    submit(conn, queue, "small", ["C"], 10, T0 + 2000)
+
+    assert finish(conn, queue, "running") == ["big"]
+
+
+def test_blocked_multi_vessel_job_is_not_starved(conn, queue, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "PORTAL_MAX_SESSIONS", 3)
+    submit(conn, queue, "x1", ["X"], 100, T0)
+    submit(conn, queue, "multi", ["X", "Y"], 100, T0 + 1)
+    # Y is free, but multi is ahead and waits for it; Z is nobody's
+    submit(conn, queue, "y1", ["Y"], 100, T0 + 2)
+    submit(conn, queue, "z1", ["Z"], 100, T0 + 3)
+    assert queue.started == ["x1", "z1"]
+
+    assert finish(conn, queue, "x1") == ["multi"]
+    assert finish(conn, queue, "multi") == ["y1"]
+
+
+def test_smaller_job_may_still_take_a_free_vessel_first(conn, queue, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "PORTAL_MAX_SESSIONS", 3)
+    submit(conn, queue, "x1", ["X"], 100, T0)
+    submit(conn, queue, "multi", ["X", "Y"], 1000, T0 + 1)
+    # Ranked ahead of multi, so it is not held back
+    submit(conn, queue, "y1", ["Y"], 10, T0 + 2)
+    assert queue.started == ["x1", "y1"]
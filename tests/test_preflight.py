@@ -0,0 +1,50 @@
+"""
+NED list clean-up before a run: normalization, blanks, duplicates and NEDs
+present in both lists (app.preflight).
+"""
+import pytest
+
+from app.preflight import normalize_ned, run_preflight, summarize
+
+
+@pytest.mark.parametrize("value, expected", [
+    (12345, "12345"),
+    (12345.0, "12345"),
+    ("12345.0", "12345"),
+    ("12345.000", "12345"),
+    ("  12345 ", "12345"),
+    ("'12345", "12345"),
+    ("12 345", "12 345"),
+    (12.5, "12.5"),
+    (float("nan"), ""),
+    (None, ""),
+    ("   ", ""),
+])
+def test_normalize_ned(value, expected):
+    assert normalize_ned(value) == expected
+
+
+def test_duplicates_keep_every_row():
+    result = run_preflight([12345, "12345.0", None, "777", " 12345 "], [])
+    off = result["off"]
+    assert off["neds"] == ["12345", "777"]
+    assert off["rows"] == [[0, 1, 4], [3]]
+    assert off["blank_rows"] == [2]
+    assert off["duplicates"] == {"12345": 3}
+
+
+def test_conflicts_are_neds_in_both_lists():
+    result = run_preflight(["5", 777.0, "12"], [" 777", 12, "9"])
+    assert result["conflicts"] == ["12", "777"]
+
+
+def test_summarize():
+    summary = summarize([12345.0, "12345", " 777 ", None, "99.0"], [777, 5, 5])
+    assert summary == {
+        "off": {"rows": 5, "unique": 3, "blank": 1, "blank_rows": [5],
+                "duplicate_count": 1, "duplicates": {"12345": 2}},
+        "on": {"rows": 3, "unique": 2, "blank": 0, "blank_rows": [],
+               "duplicate_count": 1, "duplicates": {"5": 2}},
+        "conflict_count": 1,
+        "conflicts": ["777"],
+    }
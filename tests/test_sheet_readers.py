@@ -0,0 +1,91 @@
+"""
+XlsxXmlReader re-implements what openpyxl's read-only worksheet does with a
+sheet's cells; both readers must see the same rows and columns.
+"""
+import io, zipfile
+
+import pytest
+from openpyxl import Workbook
+
+from app.sheet_readers import OpenpyxlReader, XlsxXmlReader
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+# Row 3 and column C are missing, cells are out of step with the header,
+# A5 is a formula without a cached value, row 6 is stored empty and column E is only in the dimension (A1:E7). With
+# a row 8 past the dimension, row 8 is dropped and row 7 read as empty;
+# without, reading stops at row 6.
+SHEET_XML = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="{MAIN_NS}">
+<dimension ref="A1:E7"/>
+<sheetData>
+<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="inlineStr"><is><t>Vessel</t></is></c><c r="D1" t="s"><v>1</v></c></row>
+<row r="2"><c r="A2"><v>12345</v></c><c r="B2" t="inlineStr"><is><r><t>MA</t></r><r><t>HI</t></r></is></c><c r="D2"><v>1.5</v></c></row>
+<row r="4"><c r="A4"><v>12346.0</v></c><c r="C4" t="b"><v>1</v></c><c r="E4"><v>2.5E-3</v></c></row>
+<row r="5"><c r="A5"><f>A2+1</f><v/></c><c r="B5" t="s"><v>2</v></c><c r="D5" t="str"><v>formula text</v></c></row>
+<row r="6"/>
+{{past_dimension}}
+</sheetData>
+</worksheet>"""
+
+SHARED_XML = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<sst xmlns="{MAIN_NS}" count="3" uniqueCount="3">
+<si><t>NED</t></si><si><r><t>Ra</t></r><r><t>nk</t></r></si><si><t>Deck Cadet</t></si>
+</sst>"""
+
+
+PAST_DIMENSION_ROW = '<row r="8"><c r="A8"><v>99999</v></c></row>'
+SHARED_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SHARED_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+
+@pytest.fixture(params=[False, True], ids=["within-dimension", "past-dimension"])
+def sheet(request):
+    # openpyxl writes the package (workbook, styles, content types); the sheet
+    # is swapped for the hand-written one and a shared strings part added
+    # (openpyxl itself writes inline strings only)
+    wb = Workbook()
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(buf) as src, zipfile.ZipFile(out, "w") as dst:
+        for item in src.infolist():
+            data = src.read(item.filename).decode()
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data = SHEET_XML.replace("{past_dimension}", PAST_DIMENSION_ROW if request.param else "")
+            elif item.filename == "[Content_Types].xml":
+                data = data.replace("</Types>", f'<Override PartName="/xl/sharedStrings.xml" '
+                                                f'ContentType="{SHARED_TYPE}" /></Types>')
+            elif item.filename == "xl/_rels/workbook.xml.rels":
+                data = data.replace("</Relationships>", f'<Relationship Id="rIdShared" Type="{SHARED_REL}" '
+                                                        f'Target="sharedStrings.xml" /></Relationships>')
+            dst.writestr(item, data)
+        dst.writestr("xl/sharedStrings.xml", SHARED_XML)
+    return out.getvalue(), 6 if request.param else 5
+
+
+def test_rows_match_openpyxl(sheet):
+    data, n_rows = sheet
+    expected = OpenpyxlReader().rows(io.BytesIO(data))
+    assert XlsxXmlReader().rows(io.BytesIO(data)) == expected
+    header_row, rows = expected
+    assert header_row == ["NED", "Vessel", "", "Rank", ""]
+    assert len(rows) == n_rows
+
+
+def test_columns_match_openpyxl(sheet):
+    data, n_rows = sheet
+    names = ["NED", "Vessel", "Rank", "missing"]
+    expected = OpenpyxlReader().columns(io.BytesIO(data), names)
+    assert XlsxXmlReader().columns(io.BytesIO(data), names) == expected
+    _header, count, columns = expected
+    assert count == n_rows
+    assert columns["NED"][:4] == [12345, None, 12346.0, None]
+    assert columns["Vessel"][:4] == ["MAHI", None, None, "Deck Cadet"]
+    assert columns["Rank"][:4] == [1.5, None, None, "formula text"]
+
+
+def test_headers_match_openpyxl(sheet):
+    data, _n_rows = sheet
+    assert XlsxXmlReader().headers(io.BytesIO(data)) == OpenpyxlReader().headers(io.BytesIO(data))
@@ -0,0 +1,35 @@
+"""
+Vessel name lookup in app.vessels.VesselCatalog, numeral aliases included.
+"""
+from app.vessels import VesselCatalog, normalize_vessel_name
+
+
+def catalog(*names):
+    return VesselCatalog([{"name": n, "value": str(i)} for i, n in enumerate(names)])
+
+
+def test_normalize_vessel_name():
+    assert normalize_vessel_name(" Seamec-III ") == "SEAMEC III"
+    assert normalize_vessel_name("sea  jaguar") == "SEA JAGUAR"
+    assert normalize_vessel_name(None) == ""
+
+
+def test_resolve_ignores_case_and_punctuation():
+    vessels = catalog("Sea Jaguar", "AQUATOR-2")
+    assert vessels.resolve("sea-jaguar")["name"] == "Sea Jaguar"
+    assert vessels.resolve("aquator 2")["name"] == "AQUATOR-2"
+    assert vessels.resolve("Sea Lion") is None
+    assert vessels.resolve("  ") is None
+
+
+def test_numeral_alias_resolves_when_unambiguous():
+    vessels = catalog("SEAMEC-III", "SHIVALI II")
+    assert vessels.resolve("Seamec 3")["name"] == "SEAMEC-III"
+    assert vessels.resolve("Shivali 2")["name"] == "SHIVALI II"
+
+
+def test_numeral_alias_ambiguous_keeps_names_distinct():
+    vessels = catalog("DRA I", "DRA 1")
+    assert vessels.resolve("dra i")["value"] == "0"
+    assert vessels.resolve("DRA-1")["value"] == "1"
+
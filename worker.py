@@ -1,29 +1,24 @@
-import os
-from redis import Redis
+import importlib, os, socket, sys, time
 from rq import Worker, Queue, Connection
-from app.settings import REDIS_URL
 from app.db import init_db
+from app.redis_conn import get_redis
+
+
+def worker_name(index: int) -> str:
+    # pid suffix keeps names unique when the supervisor restarts a crashed worker
+    # before its old registration has expired in Redis
+    return f"{socket.gethostname()}-w{index}-{os.getpid()}"
 
-def redis_from_url(url: str) -> Redis:
-    import urllib.parse
-    u = urllib.parse.urlparse(url)
-    db = int((u.path or "/0").replace("/", "") or "0")
-    
-    # Check if using SSL (rediss://)
-    use_ssl = u.scheme == "rediss"
-    
-    return Redis(
-        host=u.hostname or "localhost",
-        port=u.port or 6379,
-        db=db,
-        password=u.password,
-        ssl=use_ssl,
-        ssl_cert_reqs=None if use_ssl else None
-    )
 
 if __name__ == "__main__":
+    started = time.perf_counter()
+    index = int(sys.argv[1]) if len(sys.argv) > 1 else 0
     init_db()
-    redis_conn = redis_from_url(REDIS_URL)
+    redis_conn = get_redis()
+    # Import the job code (and Playwright) once here; rq forks a work horse per
+    # job, and each would otherwise import it again before doing any work.
+    importlib.import_module("worker.tasks")
+    print(f"[worker {index}] ready in {time.perf_counter() - started:.2f}s")
     with Connection(redis_conn):
-        worker = Worker([Queue("pob")])
+        worker = Worker([Queue("pob")], name=worker_name(index))
         worker.work()
@@ -1,2 +1,2 @@
-from . import tasks
-from . import automation
+# Submodules are imported on demand: worker.automation pulls in Playwright,
+# which neither the web process nor the supervisor needs.
@@ -1,10 +1,13 @@
-import os
-import time
+import sys, time
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-from app.settings import POB_USERNAME, POB_PASSWORD, DATA_DIR, HEADLESS
-from app.excel_utils import read_rows_as_dicts, write_failed_rows
-
-POB_URL = "https://pob.ongc.co.in/login"
+from app.settings import (
+    POB_URL, POB_USERNAME, POB_PASSWORD, HEADLESS, POB_LOCATION_URL, VESSEL_SYNC_MAX_AGE_HOURS
+)
+from app.db import replace_vessels
+from app.vessels import get_catalog
+from app.preflight import normalize_ned, run_preflight
+from app.excel_utils import read_columns
+from worker.browser_memory import MemoryWatchdog
 
 # ---------------- SELECTORS ----------------
 SEL_USERNAME = 'input#cpfno, input[name="cpfno"]'
@@ -247,11 +250,56 @@ def get_selected_count(page) -> int:
         return 0
 
 
-def select_vessel(page, vessel_name: str):
+def read_vessel_options(page) -> list[dict]:
+    """All {"name", "value"} options of the location dropdown (placeholder skipped)."""
+    dd = page.locator(SEL_VESSEL_DROPDOWN).first
+    dd.wait_for(state="visible", timeout=60000)
+    options = dd.evaluate(
+        """(sel) => Array.from(sel.options).map(o => ({name: o.textContent.trim(), value: o.value}))"""
+    )
+    return [o for o in options if o["name"] and o["value"]]
+
+
+def sync_vessel_catalog(page):
+    """Refresh the vessel catalog from the dropdown we are already looking at."""
+    try:
+        options = read_vessel_options(page)
+        if options:
+            replace_vessels(options)
+            get_catalog(force=True)
+            print(f"✓ Vessel catalog synced ({len(options)} locations)")
+    except Exception as e:
+        print(f"⚠ Vessel catalog sync failed: {e}")
+
+
+def select_vessel(page, vessel_name: str, value: str = None):
+    """
+    Switch location. With a cached option value we skip the label scan, skip
+    navigation entirely when that location is already selected, and use a
+    direct location URL when POB_LOCATION_URL is configured.
+    """
+    if value is None:
+        entry = get_catalog().resolve(vessel_name)
+        value = entry["value"] if entry else None
+
     dd = page.locator(SEL_VESSEL_DROPDOWN).first
     dd.wait_for(state="visible", timeout=60000)
-    with page.expect_navigation(wait_until="domcontentloaded", timeout=60000):
-        dd.select_option(label=vessel_name)
+
+    if value:
+        try:
+            if dd.input_value() == value:
+                print(f"  → Location already selected")
+                return
+        except Exception:
+            pass
+        if POB_LOCATION_URL:
+            goto_with_retry(page, POB_LOCATION_URL.format(value=value), attempts=3)
+        else:
+            with page.expect_navigation(wait_until="domcontentloaded", timeout=60000):
+                dd.select_option(value=value)
+    else:
+        with page.expect_navigation(wait_until="domcontentloaded", timeout=60000):
+            dd.select_option(label=vessel_name)
     page.wait_for_timeout(300)
 
 
@@ -271,10 +319,20 @@ def ensure_filter_off_duty(page):
         pass
 
 
-def search_and_select_by_row_text(page, ned_value: str) -> bool:
-    """Search for NED and select checkbox - wait for actual table row to appear"""
+class PortalUnavailable(Exception):
+    """The portal health breaker opened (app.portal_health); stop using the portal."""
+
+
+def search_and_select_by_row_text(page, ned_value: str, outcome: dict = None) -> bool:
+    """
+    Search for NED and select checkbox - wait for actual table row to appear.
+    outcome["kind"] is set to how the search ended: selected, select_failed,
+    no_items, timeout or fill_failed.
+    """
+    outcome = outcome if outcome is not None else {}
     ned_value = _as_text(ned_value)
     if not ned_value:
+        outcome["kind"] = "fill_failed"
         return False
 
     print(f"\n🔍 Searching for: {ned_value}")
@@ -286,6 +344,7 @@ def search_and_select_by_row_text(page, ned_value: str) -> bool:
     search = page.locator(SEL_SEARCH_INPUT).first
     if not fill_search_input_safely(search, ned_value):
         print(f"  ✗ Failed to fill search box properly")
+        outcome["kind"] = "fill_failed"
         return False
 
     # Press Enter
@@ -306,7 +365,9 @@ def search_and_select_by_row_text(page, ned_value: str) -> bool:
         page.wait_for_timeout(2000)
         
         # Try to select the checkbox
-        return select_checkbox_via_livewire_component(page, ned_value)
+        selected = select_checkbox_via_livewire_component(page, ned_value)
+        outcome["kind"] = "selected" if selected else "select_failed"
+        return selected
         
     except Exception as e:
         print(f"  ✗ Row did not appear within 20 seconds")
@@ -317,11 +378,13 @@ def search_and_select_by_row_text(page, ned_value: str) -> bool:
             no_items = page.locator(SEL_NO_ITEMS_TEXT).first
             if no_items.is_visible(timeout=1000):
                 print(f"  ✗ 'No items found' message displayed")
+                outcome["kind"] = "no_items"
                 return False
         except Exception:
             pass
         
         print(f"  ✗ Failed to find row")
+        outcome["kind"] = "timeout"
         return False
 
 
@@ -392,16 +455,66 @@ def bulk_assign_via_livewire(page, mode: str) -> bool:
         return False
 
 
-def process_excel_list(page, neds: list[str], rows: list[dict], header_row: list,
-                       bulk_mode: str, apply_off_duty_filter: bool) -> list[dict]:
+# ned_results reason per search outcome (see search_and_select_by_row_text)
+SEARCH_FAILURE_REASONS = {
+    "no_items": "not found",
+    "timeout": "search timed out",
+    "fill_failed": "search box not ready",
+    "select_failed": "not selectable",
+}
+# Outcomes that mean the portal answered; the rest count against its health
+PORTAL_ANSWERED = ("selected", "select_failed", "no_items")
+
+
+def _timed_bulk(page, mode: str, monitor) -> bool:
+    started = time.time()
+    success = bulk_assign_via_livewire(page, mode)
+    if monitor is not None:
+        monitor.record("bulk", (time.time() - started) * 1000, success)
+    return success
+
+
+def process_ned_list(page, neds: list[str], bulk_mode: str, apply_off_duty_filter: bool,
+                     on_item=None, on_result=None, monitor=None, checkpoint=None) -> list[int]:
     """
-    Process list of NEDs with batch bulk actions
+    Process list of NEDs with batch bulk actions.
+    Returns the indices (into neds) that failed.
+
+    on_item(idx) is called after each NED has been searched (progress).
+    on_result(idx, ok, reason, elapsed_ms) is called once a NED's outcome is
+    final: straight away for search failures, after the bulk action for
+    selected NEDs.
+    monitor (app.portal_health.PortalMonitor) gets search and bulk latencies;
+    it slows the pace while the portal is degraded and raises
+    PortalUnavailable before the next NED once the breaker opens.
+    checkpoint() is called after each full batch, when nothing is selected,
+    and returns the page to carry on with (a recycled one after a memory
+    check, see PortalSession.checkpoint). Its exceptions are not caught.
     """
-    failed_rows = []
+    failed = []
     batch = []
     batch_indices = []
+    elapsed = {}
+
+    def result(idx, ok, reason=None):
+        if not ok:
+            failed.append(idx)
+        if on_result is not None:
+            on_result(idx, ok, reason, elapsed.get(idx))
+
+    def finish_batch(ok, reason=None):
+        for batch_idx in batch_indices:
+            result(batch_idx, ok, reason)
 
     for idx, ned in enumerate(neds):
+        if monitor is not None:
+            if monitor.is_open():
+                raise PortalUnavailable("portal unavailable (health breaker open), stopped before "
+                                        f"{len(neds) - idx} of {len(neds)} NEDs")
+            if monitor.pacing_ms():
+                page.wait_for_timeout(monitor.pacing_ms())
+        started = time.time()
+        batch_done = False
         try:
             # Apply OFF DUTY filter if needed (for ON DUTY operations)
             if apply_off_duty_filter and len(batch) == 0:
@@ -409,34 +522,49 @@ def process_excel_list(page, neds: list[str], rows: list[dict], header_row: list
                 ensure_filter_off_duty(page)
                 page.wait_for_timeout(500)
 
-            ok = search_and_select_by_row_text(page, ned)
+            outcome = {}
+            ok = search_and_select_by_row_text(page, ned, outcome)
+            elapsed[idx] = int((time.time() - started) * 1000)
+            if monitor is not None:
+                monitor.record("search", elapsed[idx], outcome.get("kind") in PORTAL_ANSWERED)
             if ok:
                 print(f"  ✓ Successfully selected")
                 batch.append(ned)
                 batch_indices.append(idx)
                 page.wait_for_timeout(500)
-                
+
                 # Perform bulk action when batch reaches 10
                 if len(batch) >= 10:
-                    success = bulk_assign_via_livewire(page, bulk_mode)
+                    success = _timed_bulk(page, bulk_mode, monitor)
                     if not success:
                         print(f"  ✗ Batch failed - marking {len(batch)} rows as failed")
-                        # If bulk action failed, mark all in batch as failed
-                        for batch_idx in batch_indices:
-                            failed_rows.append(rows[batch_idx])
-                    
+                    # If bulk action failed, mark all in batch as failed
+                    finish_batch(success, None if success else "bulk action failed")
+
                     # Reset batch
                     batch = []
                     batch_indices = []
+                    batch_done = True
                     page.wait_for_timeout(1000)
             else:
                 print(f"  ✗ Failed to select - adding to failed rows")
-                failed_rows.append(rows[idx])
+                result(idx, False, SEARCH_FAILURE_REASONS.get(outcome.get("kind"), "not found or not selectable"))
 
         except Exception as e:
             print(f"  ✗ Exception: {e}")
-            failed_rows.append(rows[idx])
-            continue
+            if idx not in elapsed:
+                elapsed[idx] = int((time.time() - started) * 1000)
+                if monitor is not None:
+                    monitor.record("search", elapsed[idx], False)
+            result(idx, False, f"error: {e}"[:500])
+
+        if on_item is not None:
+            on_item(idx)
+
+        # Outside the NED's try: the batch's outcomes are final by now, and a
+        # failed recycle leaves no page to carry on with, so it ends the run
+        if batch_done and checkpoint is not None:
+            page = checkpoint()
 
     # Process remaining items in batch
     if len(batch) > 0:
@@ -445,43 +573,68 @@ def process_excel_list(page, neds: list[str], rows: list[dict], header_row: list
             if apply_off_duty_filter:
                 ensure_filter_off_duty(page)
                 page.wait_for_timeout(500)
-            
-            success = bulk_assign_via_livewire(page, bulk_mode)
+
+            success = _timed_bulk(page, bulk_mode, monitor)
             if not success:
                 print(f"  ✗ Final batch failed - marking {len(batch)} rows as failed")
-                # If bulk action failed, mark all in batch as failed
-                for batch_idx in batch_indices:
-                    failed_rows.append(rows[batch_idx])
+            # If bulk action failed, mark all in batch as failed
+            finish_batch(success, None if success else "bulk action failed")
         except Exception as e:
             print(f"  ✗ Exception in final batch: {e}")
             # If bulk action failed, mark all in batch as failed
-            for batch_idx in batch_indices:
-                failed_rows.append(rows[batch_idx])
+            finish_batch(False, f"bulk action error: {e}"[:500])
 
-    print(f"\n✅ Completed. Failed rows: {len(failed_rows)}/{len(neds)}")
-    return failed_rows
+    print(f"\n✅ Completed. Failed rows: {len(failed)}/{len(neds)}")
+    return sorted(failed)
 
 
-def run_portal_automation(job_id: str, upload1_path: str, upload2_path: str,
-                          col1: str, col2: str, vessel: str):
-    job_dir = os.path.join(DATA_DIR, job_id)
-    os.makedirs(job_dir, exist_ok=True)
-
-    header1, rows1 = read_rows_as_dicts(upload1_path)
-    header2, rows2 = read_rows_as_dicts(upload2_path)
+class PortalSession:
+    """
+    One browser and one logged-in portal session. Used as a context manager;
+    several jobs can be processed before it logs out.
 
-    neds1 = [_as_text(r.get(col1)) for r in rows1]
-    neds2 = [_as_text(r.get(col2)) for r in rows2]
+    on_memory(summary) gets the memory watchdog summary after every recycle
+    and when the session closes (see worker.browser_memory).
+    """
 
-    print(f"\n📊 Excel 1: {len(neds1)} NEDs")
-    print(f"📊 Excel 2: {len(neds2)} NEDs")
+    def __init__(self, monitor=None, on_memory=None):
+        self.monitor = monitor
+        self.on_memory = on_memory
+        self.watchdog = MemoryWatchdog()
+        self._playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+
+    def __enter__(self):
+        self._playwright = sync_playwright().start()
+        try:
+            self.browser = self._playwright.chromium.launch(headless=HEADLESS)
+            self.context = self._new_context()
+            self.page = self.context.new_page()
+            self.watchdog.attach(self.context, self.page)
+            self.login()
+        except Exception:
+            self.close()
+            raise
+        return self
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=HEADLESS)
-        context = browser.new_context()
-        page = context.new_page()
+    def __exit__(self, exc_type, exc, tb):
+        self.logout()
+        self.close()
+        return False
 
-        goto_with_retry(page, POB_URL, attempts=3)
+    def login(self):
+        page = self.page
+        started = time.time()
+        try:
+            goto_with_retry(page, POB_URL, attempts=3)
+        except Exception:
+            if self.monitor is not None:
+                self.monitor.record("page_load", (time.time() - started) * 1000, False)
+            raise
+        if self.monitor is not None:
+            self.monitor.record("page_load", (time.time() - started) * 1000, True)
 
         user_input = _first_visible_locator_in_any_frame(page, SEL_USERNAME, timeout_ms=60000)
         pass_input = _first_visible_locator_in_any_frame(page, SEL_PASSWORD, timeout_ms=60000)
@@ -496,23 +649,67 @@ def run_portal_automation(job_id: str, upload1_path: str, upload2_path: str,
         except Exception:
             page.wait_for_timeout(2000)
 
-        select_vessel(page, vessel)
-        print(f"✓ Selected vessel: {vessel}")
+        # The location dropdown is on the landing page; keep the catalog fresh for free
+        catalog = get_catalog()
+        if catalog.synced_at is None or time.time() - catalog.synced_at > VESSEL_SYNC_MAX_AGE_HOURS * 3600:
+            sync_vessel_catalog(page)
+
+    def _new_context(self, **options):
+        """Every browser context of the session is made here (bench.portal_replay hooks in)."""
+        return self.browser.new_context(**options)
+
+    def checkpoint(self, vessel: str = None):
+        """
+        Memory check at a safe point (no selection pending). Past the limits
+        the browser context is recycled and `vessel` selected again. Returns
+        the page to use from here on.
+        """
+        current = self.watchdog.sample()
+        reason = self.watchdog.over_limit(current)
+        if reason:
+            self.recycle(vessel, reason)
+            self._report_memory()
+        return self.page
+
+    def recycle(self, vessel: str = None, reason: str = "requested"):
+        """
+        Swap the browser context for a fresh one (a new renderer), carrying
+        the login cookies over with storage_state. The OFF DUTY filter is not
+        restored here; process_ned_list applies it again before its next batch.
+        """
+        started = time.time()
+        before = dict(self.watchdog.last)
+        state = self.context.storage_state()
+        try:
+            self.context.close()
+        except Exception:
+            pass
+        self.context = self._new_context(storage_state=state)
+        self.page = self.context.new_page()
+        self.watchdog.attach(self.context, self.page)
 
-        # Process first list (mark as OFF DUTY)
-        print("\n" + "="*50)
-        print("Processing Excel 1 (OFF DUTY)...")
-        print("="*50)
-        failed1 = process_excel_list(page, neds1, rows1, header1, bulk_mode="OFF", apply_off_duty_filter=False)
-        
-        page.wait_for_timeout(2000)
-        
-        # Process second list (mark as ON DUTY - need OFF DUTY filter)
-        print("\n" + "="*50)
-        print("Processing Excel 2 (ON DUTY)...")
-        print("="*50)
-        failed2 = process_excel_list(page, neds2, rows2, header2, bulk_mode="ON", apply_off_duty_filter=True)
+        goto_with_retry(self.page, POB_URL, attempts=3)
+        try:
+            self.page.locator(SEL_VESSEL_DROPDOWN).first.wait_for(state="visible", timeout=10000)
+        except Exception:
+            # Session cookie did not carry over: log in again
+            self.login()
+        if vessel:
+            select_vessel(self.page, vessel)
+        self.watchdog.recycled(reason, before, time.time() - started)
+
+    def _report_memory(self):
+        if self.on_memory is None:
+            return
+        try:
+            self.on_memory(self.watchdog.summary())
+        except Exception as e:
+            print(f"⚠ Could not report browser memory: {e}")
 
+    def logout(self):
+        page = self.page
+        if page is None:
+            return
         try:
             user_menu = page.locator(SEL_USER_MENU).first
             user_menu.wait_for(state="visible", timeout=60000)
@@ -527,22 +724,257 @@ def run_portal_automation(job_id: str, upload1_path: str, upload2_path: str,
         except Exception:
             pass
 
-        try:
-            context.close()
-        except Exception:
-            pass
-        try:
-            browser.close()
-        except Exception:
-            pass
+    def close(self):
+        if self.browser is not None:
+            try:
+                self.watchdog.sample()
+            except Exception:
+                pass
+            self._report_memory()
+        for obj in (self.context, self.browser):
+            if obj is None:
+                continue
+            try:
+                obj.close()
+            except Exception:
+                pass
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+        self.context = self.browser = self.page = self._playwright = None
+
+
+def _row_vessels(values, n_rows: int, default: str) -> list[str]:
+    if values is None:
+        return [default] * n_rows
+    catalog = get_catalog()
+    vessels = []
+    for v in values:
+        name = _as_text(v) or default
+        entry = catalog.resolve(name)
+        vessels.append(entry["name"] if entry else name)
+    return vessels
+
+
+def _read_list(path: str, col: str, vessel_col) -> tuple:
+    """NED values and vessel values (None without a vessel column) of one upload."""
+    header, columns = read_columns(path, [col] + ([vessel_col] if vessel_col else []))
+    if col not in columns:
+        raise ValueError(f"Column not found: {col}")
+    return columns[col], columns.get(vessel_col)
+
+
+def load_job_lists(job: dict) -> dict:
+    """Read the NED (and vessel) columns of both uploads of a job row."""
+    values1, vessel_values1 = _read_list(job["upload1_path"], job["col1"], job.get("vessel_col1"))
+    values2, vessel_values2 = _read_list(job["upload2_path"], job["col2"], job.get("vessel_col2"))
+    default = job.get("vessel") or ""
+    return {
+        "job_id": job["job_id"],
+        "preflight": run_preflight(values1, values2),
+        "neds1": [normalize_ned(v) for v in values1],
+        "vessels1": _row_vessels(vessel_values1, len(values1), default),
+        "neds2": [normalize_ned(v) for v in values2],
+        "vessels2": _row_vessels(vessel_values2, len(values2), default),
+    }
+
+
+def _merge_lists(specs: list[dict], which: str, vessel: str):
+    """
+    Combine one list ("1" = OFF, "2" = ON) for one vessel from several jobs
+    into a single NED list. Each NED is searched once; owners[i] lists every
+    (spec index, row index) that asked for neds[i]. Blank NEDs are left out,
+    they are failed by pre-flight without a search.
+    """
+    neds, owners, seen = [], [], {}
+    for spec_idx, spec in enumerate(specs):
+        for row_idx, ned in enumerate(spec["neds" + which]):
+            if not ned or spec["vessels" + which][row_idx] != vessel:
+                continue
+            if ned in seen:
+                owners[seen[ned]].append((spec_idx, row_idx))
+                continue
+            seen[ned] = len(neds)
+            neds.append(ned)
+            owners.append([(spec_idx, row_idx)])
+    return neds, owners
+
+
+def run_coalesced_automation(specs: list[dict], on_progress=None, on_results=None, on_step=None,
+                             monitor=None, on_memory=None, session_class=None) -> dict:
+    """
+    Process one or more jobs in a single portal session, switching vessel with
+    select_vessel as needed. For each vessel all OFF DUTY lists are run
+    together, then all ON DUTY lists, so bulk batches are shared between jobs.
+
+    on_progress(job_id, progress) is called as NEDs are processed.
+    on_results(records) receives per-row outcomes as soon as they are final
+    (see app.db.record_ned_results for the record layout).
+    on_step(timing) receives {"vessel", "step", "items", "seconds", "finished_at"}
+    for login, select_vessel, off_duty, on_duty and logout (see app.estimates).
+    monitor (app.portal_health.PortalMonitor) is fed portal latencies; raises
+    PortalUnavailable if its breaker opens mid-run.
+    on_memory(summary) receives the browser memory watchdog summary
+    (PortalSession); the page is recycled between batches when it grows
+    past BROWSER_RECYCLE_RENDERER_MB / BROWSER_RECYCLE_JS_HEAP_MB.
+    session_class replaces PortalSession (record/replay in bench.portal_replay).
+    Returns {job_id: {"failed1": n, "failed2": n}}.
+    """
+    vessels = []
+    for spec in specs:
+        for v in spec["vessels1"] + spec["vessels2"]:
+            if v and v not in vessels:
+                vessels.append(v)
+
+    failed = [{"excel1": 0, "excel2": 0} for _ in specs]
+    pending = []
+
+    def record(spec_idx, which, row_idx, ok, reason=None, elapsed_ms=None):
+        spec = specs[spec_idx]
+        n = "1" if which == "excel1" else "2"
+        if not ok:
+            failed[spec_idx][which] += 1
+        pending.append({
+            "job_id": spec["job_id"],
+            "list": which,
+            "row_num": row_idx + 2,    # Excel row number (header is row 1)
+            "ned": spec["neds" + n][row_idx],
+            "vessel": spec["vessels" + n][row_idx],
+            "status": "ok" if ok else "failed",
+            "reason": reason,
+            "elapsed_ms": elapsed_ms,
+            "finished_at": time.time(),
+        })
+
+    def flush():
+        if pending and on_results is not None:
+            on_results(list(pending))
+        pending.clear()
+
+    progress = [{} for _ in specs]
+    for spec_idx, spec in enumerate(specs):
+        # Rows without a vessel or a NED cannot be processed
+        for which, n in (("excel1", "1"), ("excel2", "2")):
+            for row_idx, (v, ned) in enumerate(zip(spec["vessels" + n], spec["neds" + n])):
+                if not ned:
+                    record(spec_idx, which, row_idx, False, "blank NED")
+                elif not v:
+                    record(spec_idx, which, row_idx, False, "no vessel")
+        for v in vessels:
+            n_off = sum(1 for vv, n in zip(spec["vessels1"], spec["neds1"]) if vv == v and n)
+            n_on = sum(1 for vv, n in zip(spec["vessels2"], spec["neds2"]) if vv == v and n)
+            if n_off or n_on:
+                progress[spec_idx][v] = {
+                    "state": "pending",
+                    "off": {"done": 0, "total": n_off},
+                    "on": {"done": 0, "total": n_on},
+                }
+    flush()
+
+    def report(spec_indices):
+        if on_progress is None:
+            return
+        for spec_idx in sorted(spec_indices):
+            on_progress(specs[spec_idx]["job_id"], progress[spec_idx])
+
+    def tracker(owners, vessel, key):
+        def on_item(i):
+            flush()
+            for spec_idx, _ in owners[i]:
+                progress[spec_idx][vessel][key]["done"] += 1
+            report({spec_idx for spec_idx, _ in owners[i]})
+        return on_item
+
+    def recorder(owners, which):
+        def on_result(i, ok, reason, elapsed_ms):
+            for spec_idx, row_idx in owners[i]:
+                record(spec_idx, which, row_idx, ok, reason, elapsed_ms)
+        return on_result
+
+    def timed(step, vessel, items, started):
+        if on_step is not None:
+            now = time.time()
+            on_step({"vessel": vessel, "step": step, "items": items,
+                     "seconds": now - started, "finished_at": now})
+
+    def set_state(vessel, state):
+        touched = {i for i, p in enumerate(progress) if vessel in p}
+        for i in touched:
+            progress[i][vessel]["state"] = state
+        report(touched)
+
+    print(f"\n📊 Jobs in session: {len(specs)} ({', '.join(s['job_id'] for s in specs)})")
+    for spec in specs:
+        pf = spec.get("preflight")
+        if pf and (pf["conflicts"] or pf["off"]["duplicates"] or pf["on"]["duplicates"]):
+            print(f"⚠ Pre-flight {spec['job_id']}: {len(pf['conflicts'])} NED(s) in both lists, "
+                  f"{len(pf['off']['duplicates']) + len(pf['on']['duplicates'])} duplicated NED(s)")
+
+    plan = []
+    for vessel in vessels:
+        off_neds, off_owners = _merge_lists(specs, "1", vessel)
+        on_neds, on_owners = _merge_lists(specs, "2", vessel)
+        if off_neds or on_neds:
+            plan.append((vessel, off_neds, off_owners, on_neds, on_owners))
+
+    if not plan:
+        # Nothing searchable after pre-flight: no reason to start a browser
+        print("📊 No NEDs to process after pre-flight, skipping portal session")
+    else:
+        print(f"📊 Vessels: {', '.join(p[0] for p in plan)}")
+        started = time.time()
+        with (session_class or PortalSession)(monitor, on_memory) as session:
+            timed("login", "", 1, started)
+            for vessel, off_neds, off_owners, on_neds, on_owners in plan:
+                print(f"\n🚢 {vessel}: Excel 1 {len(off_neds)} NEDs, Excel 2 {len(on_neds)} NEDs")
+
+                set_state(vessel, "running")
+                session.checkpoint()
+                started = time.time()
+                try:
+                    select_vessel(session.page, vessel)
+                finally:
+                    if monitor is not None:
+                        monitor.record("page_load", (time.time() - started) * 1000, sys.exc_info()[0] is None)
+                timed("select_vessel", vessel, 1, started)
+                print(f"✓ Selected vessel: {vessel}")
+
+                # Process first list (mark as OFF DUTY)
+                print("\n" + "="*50)
+                print("Processing Excel 1 (OFF DUTY)...")
+                print("="*50)
+                started = time.time()
+                process_ned_list(session.page, off_neds, bulk_mode="OFF", apply_off_duty_filter=False,
+                                 on_item=tracker(off_owners, vessel, "off"),
+                                 on_result=recorder(off_owners, "excel1"), monitor=monitor,
+                                 checkpoint=lambda: session.checkpoint(vessel))
+                flush()
+
+                session.page.wait_for_timeout(2000)
+                session.checkpoint(vessel)
+                timed("off_duty", vessel, len(off_neds), started)
+
+                # Process second list (mark as ON DUTY - need OFF DUTY filter)
+                print("\n" + "="*50)
+                print("Processing Excel 2 (ON DUTY)...")
+                print("="*50)
+                started = time.time()
+                process_ned_list(session.page, on_neds, bulk_mode="ON", apply_off_duty_filter=True,
+                                 on_item=tracker(on_owners, vessel, "on"),
+                                 on_result=recorder(on_owners, "excel2"), monitor=monitor,
+                                 checkpoint=lambda: session.checkpoint(vessel))
+                flush()
+                timed("on_duty", vessel, len(on_neds), started)
+                set_state(vessel, "done")
+            started = time.time()
+        timed("logout", "", 1, started)
+
+    results = {}
+    for spec_idx, spec in enumerate(specs):
+        results[spec["job_id"]] = {"failed1": failed[spec_idx]["excel1"], "failed2": failed[spec_idx]["excel2"]}
+        print(f"\n📁 {spec['job_id']}: {failed[spec_idx]['excel1']} Excel 1 and "
+              f"{failed[spec_idx]['excel2']} Excel 2 rows failed")
+    return results
 
-    out1 = os.path.join(job_dir, "excel1_failed_rows.xlsx")
-    out2 = os.path.join(job_dir, "excel2_failed_rows.xlsx")
-    write_failed_rows(out1, header1, failed1)
-    write_failed_rows(out2, header2, failed2)
-    
-    print(f"\n📁 Output files created:")
-    print(f"  - {out1}")
-    print(f"  - {out2}")
-    
-    return out1, out2
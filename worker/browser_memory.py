@@ -0,0 +1,145 @@
+"""
+Browser memory watchdog for long portal sessions.
+
+Between NED batches PortalSession.checkpoint() takes a sample:
+  - renderer JS heap and DOM node count of the working page, through the
+    CDP Performance domain (Performance.getMetrics)
+  - RSS of this worker's browser processes from /proc (Chromium renderers
+    are told apart by their --type=renderer command line)
+When the renderer RSS or the JS heap is past its limit the session recycles
+its browser context there, at a batch boundary, so no half-built selection
+is lost. summary() is what ends up in the job's browser_memory column.
+"""
+import os, time
+
+from app.settings import BROWSER_RECYCLE_RENDERER_MB, BROWSER_RECYCLE_JS_HEAP_MB
+
+MAX_RECYCLES = 20    # per session; a page that bloats right away is not worth a restart loop
+
+
+def _children(pid: int) -> dict:
+    """{ppid: [pid, ...]} for every process visible in /proc."""
+    tree = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # comm may contain spaces; ppid is the second field after ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        tree.setdefault(ppid, []).append(int(name))
+    return tree
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _is_renderer(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return b"--type=renderer" in f.read()
+    except OSError:
+        return False
+
+
+def browser_rss_mb(root_pid: int = None) -> dict:
+    """
+    RSS of the processes under this worker (Playwright driver and Chromium),
+    in MB: {"total": ..., "renderer": ...}. Zeros where /proc is unavailable.
+    """
+    if not os.path.isdir("/proc"):
+        return {"total": 0.0, "renderer": 0.0}
+    tree = _children(root_pid or os.getpid())
+    total = renderer = 0.0
+    stack = list(tree.get(root_pid or os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(tree.get(pid, []))
+        rss = _rss_mb(pid)
+        total += rss
+        if _is_renderer(pid):
+            renderer += rss
+    return {"total": round(total, 1), "renderer": round(renderer, 1)}
+
+
+class MemoryWatchdog:
+    def __init__(self):
+        self._cdp = None
+        self.samples = 0
+        self.peak = {"rss_mb": 0.0, "renderer_mb": 0.0, "js_heap_mb": 0.0, "nodes": 0}
+        self.last = {}
+        self.recycles = []
+
+    def attach(self, context, page):
+        """Open a CDP session on the (new) working page."""
+        self._cdp = None
+        try:
+            self._cdp = context.new_cdp_session(page)
+            self._cdp.send("Performance.enable")
+        except Exception as e:
+            print(f"⚠ CDP performance metrics unavailable: {e}")
+
+    def _page_metrics(self) -> dict:
+        if self._cdp is None:
+            return {}
+        try:
+            metrics = {m["name"]: m["value"] for m in self._cdp.send("Performance.getMetrics")["metrics"]}
+        except Exception:
+            return {}
+        return {
+            "js_heap_mb": round(metrics.get("JSHeapUsedSize", 0) / (1024 * 1024), 1),
+            "nodes": int(metrics.get("Nodes", 0)),
+        }
+
+    def sample(self) -> dict:
+        rss = browser_rss_mb()
+        current = {"rss_mb": rss["total"], "renderer_mb": rss["renderer"], **self._page_metrics()}
+        self.samples += 1
+        self.last = current
+        for key, value in current.items():
+            self.peak[key] = max(self.peak.get(key, 0), value)
+        return current
+
+    def over_limit(self, current: dict):
+        """Why the page should be recycled now, or None."""
+        if len(self.recycles) >= MAX_RECYCLES:
+            return None
+        if BROWSER_RECYCLE_RENDERER_MB and current.get("renderer_mb", 0) > BROWSER_RECYCLE_RENDERER_MB:
+            return f"renderer {current['renderer_mb']:.0f} MB"
+        if BROWSER_RECYCLE_JS_HEAP_MB and current.get("js_heap_mb", 0) > BROWSER_RECYCLE_JS_HEAP_MB:
+            return f"JS heap {current['js_heap_mb']:.0f} MB"
+        return None
+
+    def recycled(self, reason: str, before: dict, seconds: float):
+        after = self.sample()
+        event = {
+            "at": time.time(),
+            "reason": reason,
+            "seconds": round(seconds, 1),
+            "renderer_mb_before": before.get("renderer_mb"),
+            "renderer_mb_after": after.get("renderer_mb"),
+            "js_heap_mb_before": before.get("js_heap_mb"),
+            "js_heap_mb_after": after.get("js_heap_mb"),
+        }
+        self.recycles.append(event)
+        print(f"♻ Recycled browser context ({reason}) in {event['seconds']}s: renderer "
+              f"{event['renderer_mb_before']} -> {event['renderer_mb_after']} MB, JS heap "
+              f"{event['js_heap_mb_before']} -> {event['js_heap_mb_after']} MB")
+
+    def summary(self) -> dict:
+        return {
+            "samples": self.samples,
+            "peak": self.peak,
+            "last": self.last,
+            "recycles": self.recycles,
+        }
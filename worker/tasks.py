@@ -1,25 +1,155 @@
-import os
-from app.db import get_job, update_job
-from app.settings import DATA_DIR
-from worker.automation import run_portal_automation
+import os, time
+from rq import Queue, get_current_job
+from app import estimates, job_scheduler, status_cache
+from app.db import get_job, update_job, record_ned_results, record_step_timings
+from app.settings import DATA_DIR, POB_USERNAME, COALESCE_MAX_JOBS, COALESCE_MAX_ROWS
+from app.portal_health import PortalMonitor
+from app.redis_conn import get_redis
+from worker.automation import load_job_lists, run_coalesced_automation, PortalSession, sync_vessel_catalog
+
+
+def _release_slot(job_id: str):
+    """Free this job's vessel/account slot and start whatever it was blocking."""
+    rq_job = get_current_job()
+    if rq_job is None:
+        return
+    job_scheduler.release(rq_job.connection, job_id)
+    job_scheduler.dispatch(rq_job.connection, Queue("pob", connection=rq_job.connection))
+
+
+def _requeue(conn, job: dict):
+    """Put a job that never touched the portal back in the scheduler's pending set."""
+    job_scheduler.release(conn, job["job_id"])
+    job_scheduler.submit(
+        conn, Queue("pob", connection=conn), job["job_id"], account=POB_USERNAME,
+        vessels=job["vessels"], rows=(job.get("rows1") or 0) + (job.get("rows2") or 0),
+        timeout=job.get("job_timeout") or estimates.job_timeout(job.get("predicted_seconds") or 0),
+        predicted=job.get("predicted_seconds"), queued_at=job.get("created_at"),
+    )
+
+
+def _update(job_id: str, **fields):
+    """update_job, then refresh the status document the UI polls (app.status_cache)."""
+    update_job(job_id, **fields)
+    status_cache.refresh(get_redis(), job_id)
+
+
+def _ned_set(neds):
+    return {n for n in neds if n}
+
+
+def _coalesce(conn, job: dict, spec: dict, timeout: int = None) -> list[dict]:
+    """
+    Claim queued jobs for the same vessel(s) so they run in this job's session.
+    A candidate is skipped when merging would change the outcome: one of its
+    OFF NEDs is in an ON list already merged, or the other way round, and
+    when its predicted run no longer fits in this job's RQ timeout.
+    """
+    off, on = _ned_set(spec["neds1"]), _ned_set(spec["neds2"])
+    total_rows = (job.get("rows1") or 0) + (job.get("rows2") or 0)
+    # Leave a third of the timeout as headroom for slower-than-predicted runs
+    budget = timeout * 2 / 3 - (job.get("predicted_seconds") or 0) if timeout else None
+    extra = []
+
+    for cand_id in job_scheduler.coalesce_candidates(conn, POB_USERNAME, job["vessels"]):
+        if 1 + len(extra) >= COALESCE_MAX_JOBS:
+            break
+        cand = get_job(cand_id)
+        if not cand or cand["status"] != "QUEUED":
+            continue
+        rows = (cand.get("rows1") or 0) + (cand.get("rows2") or 0)
+        if total_rows + rows > COALESCE_MAX_ROWS:
+            continue
+        predicted = cand.get("predicted_seconds") or 0
+        if budget is not None and predicted > budget:
+            continue
+        try:
+            cand_spec = load_job_lists(cand)
+        except Exception as e:
+            print(f"⚠ Not coalescing {cand_id}: {e}")
+            continue
+        cand_off, cand_on = _ned_set(cand_spec["neds1"]), _ned_set(cand_spec["neds2"])
+        if cand_off & on or cand_on & off:
+            continue
+        if not job_scheduler.claim(conn, cand_id):
+            continue
+
+        _update(cand_id, status="RUNNING", coalesced_into=job["job_id"], started_at=time.time())
+        extra.append(cand_spec)
+        off |= cand_off
+        on |= cand_on
+        total_rows += rows
+        if budget is not None:
+            budget -= predicted
+    return extra
+
 
 def run_job(job_id: str):
     job = get_job(job_id)
     if not job:
+        _release_slot(job_id)
         return
 
-    update_job(job_id, status="RUNNING")
+    rq_job = get_current_job()
+    monitor = PortalMonitor(rq_job.connection) if rq_job is not None else None
+    if monitor is not None and monitor.is_open():
+        # Dispatched just before the breaker opened: wait for the portal
+        # in the queue instead of failing against it
+        print(f"⏸ Portal unavailable, requeueing {job_id}")
+        _requeue(rq_job.connection, job)
+        return
+
+    _update(job_id, status="RUNNING", started_at=time.time())
+    job_ids = [job_id]
+    steps = []
+
+    def report_memory(summary):
+        # One browser served every coalesced job; each shows the session's figures
+        for jid in job_ids:
+            _update(jid, browser_memory=summary)
+
     try:
-        out1, out2 = run_portal_automation(
-            job_id=job_id,
-            upload1_path=job["upload1_path"],
-            upload2_path=job["upload2_path"],
-            col1=job["col1"],
-            col2=job["col2"],
-            vessel=job["vessel"],
+        specs = [load_job_lists(job)]
+        if rq_job is not None:
+            specs += _coalesce(rq_job.connection, job, specs[0], timeout=rq_job.timeout)
+            job_ids = [s["job_id"] for s in specs]
+
+        # Row outcomes go to ned_results as they happen; failed-rows files are
+        # generated from them when downloaded.
+        results = run_coalesced_automation(
+            specs,
+            on_progress=lambda jid, progress: _update(jid, progress=progress),
+            on_results=record_ned_results,
+            on_step=steps.append,
+            monitor=monitor,
+            on_memory=report_memory,
         )
-        update_job(job_id, status="COMPLETED", out1_path=out1, out2_path=out2)
+        for jid in results:
+            _update(jid, status="COMPLETED")
+        # Only completed runs feed the duration estimates (app.estimates)
+        record_step_timings(job_id, steps)
     except Exception as e:
-        update_job(job_id, status="FAILED", error=str(e))
-        # Per your requirement: provide nothing on failure (so no partial outputs).
+        for jid in job_ids:
+            _update(jid, status="FAILED", error=str(e))
         raise
+    finally:
+        _release_slot(job_id)
+
+
+def sync_vessels(job_id: str = None):
+    """
+    Log in once and refresh the vessel catalog from the location dropdown.
+    Dispatched by app.job_scheduler like a job (job_id is its slot).
+    """
+    rq_job = get_current_job()
+    monitor = PortalMonitor(rq_job.connection) if rq_job is not None else None
+    try:
+        if monitor is not None and monitor.is_open():
+            # The next stale-catalog check queues it again
+            print("⏸ Portal unavailable, skipping vessel catalog sync")
+            return
+        with PortalSession(monitor) as session:
+            sync_vessel_catalog(session.page)
+    finally:
+        if job_id:
+            _release_slot(job_id)